@@ -1,13 +1,112 @@
-from flask import Flask, request, jsonify
+import os
+import re
+import time
+from itertools import islice
+from flask import Flask, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
+from pagination import InvalidCursor, InvalidLimit, PageStream, decode_cursor, paginate, stream_json_array, stream_ndjson
+import metrics
+from metrics import SamplingProfiler, inc, observe, render_prometheus, server_timing_header, stage, start_request_timings
+from query_cache import cached_response, query_cache
+from scraped_news_service import articles_version, iter_all_articles, iter_search_articles
+from corpus import parse_date_ordinal
 from scraped_policies_search_service import policy_search_service
-from scraped_policies_timeline_service import get_policy_timeline
+from serialization import json_object
+from scraped_policies_timeline_service import DEFAULT_TIMELINE_LIMIT, get_policy_timeline
 
 load_dotenv()
 app = Flask(__name__)
 CORS(app)
 
+# index rows the scrapers append to golden_dataset while we run (poll interval in seconds)
+if os.getenv('POLICY_FOLLOW_INTERVAL'):
+    policy_search_service.follow(interval=float(os.environ['POLICY_FOLLOW_INTERVAL']))
+
+metrics.registry.gauge("policy_corpus_rows", lambda: {(): len(policy_search_service.view.corpus)},
+                       "Rows in the search corpus, deleted ones included until merged.")
+metrics.registry.gauge("policy_corpus_generation", lambda: {(): policy_search_service.generation},
+                       "Ingest/delete/merge count since the corpus was loaded.")
+metrics.registry.gauge("policy_corpus_segments", lambda: {(): len(policy_search_service.view.segments)},
+                       "Corpus segments: the bulk load plus unmerged deltas.")
+metrics.registry.gauge("query_cache_entries", lambda: {(): len(query_cache)}, "Responses held in the query cache.")
+metrics.registry.gauge("query_cache_lookups", lambda: {(("result", "hit"),): query_cache.hits,
+                                                       (("result", "miss"),): query_cache.misses},
+                       "Query cache lookups since start, by result.")
+
+@app.before_request
+def _start_instrumentation():
+    g.request_start = time.perf_counter()
+    start_request_timings()
+    # X-Profile: 1 swaps the response for a collapsed-stack profile of this request
+    if metrics.PROFILING_ENABLED and request.headers.get('X-Profile'):
+        g.profiler = SamplingProfiler().__enter__()
+
+@app.after_request
+def _finish_instrumentation(response):
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.__exit__(None, None, None)
+        profiled = Response(profiler.collapsed(), mimetype='text/plain')
+        profiled.headers['X-Profiled-Status'] = str(response.status_code)
+        return profiled
+    if metrics.ENABLED:
+        endpoint = request.endpoint or 'unmatched'
+        observe("http_request_duration_seconds", time.perf_counter() - g.get('request_start', time.perf_counter()),
+                endpoint=endpoint)
+        inc("http_requests_total", endpoint=endpoint, status=response.status_code)
+        if not response.is_streamed:
+            inc("http_response_bytes_total", response.content_length or 0, endpoint=endpoint)
+        timing = server_timing_header()
+        if timing:
+            response.headers['Server-Timing'] = timing
+    return response
+
+PHRASE_RE = re.compile(r'"([^"]+)"')
+DEFAULT_SEARCH_LIMIT = 50
+MAX_SEARCH_LIMIT = 500
+ARTICLES_PAGE_SIZE = 100
+# query parameter -> facet field it filters on
+FACET_PARAMS = {'policy': 'policies', 'name': 'names', 'source': 'source'}
+
+def _policies_version():
+    return policy_search_service.generation, policy_search_service.updated_at
+
+def _page_window(default_limit, max_limit):
+    """(offset, limit) from ?cursor= (or ?offset=) and ?limit=; limit is capped at max_limit."""
+    cursor = request.args.get('cursor')
+    if cursor:
+        offset = decode_cursor(cursor)
+    else:
+        offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = request.args.get('limit', default_limit, type=int)
+    # an empty page would hand back a cursor to itself
+    if limit < 1:
+        raise InvalidLimit(f"limit must be at least 1, got {limit}")
+    return offset, min(limit, max_limit)
+
+def _listing_response(key, items, offset, limit, extra=None):
+    """Serve items one page at a time, or stream the page with ?stream=ndjson|json.
+
+    items must be a lazy iterator already positioned at offset; it is only
+    consumed as the response is written. A streamed page ends with its
+    next_cursor: after the array for json, as a last {"next_cursor": ...}
+    line for ndjson. It is null on the last page, as in a plain response.
+    """
+    extra = extra or {}
+    mode = request.args.get('stream')
+    if mode in ('ndjson', 'json'):
+        page = PageStream(items, offset, limit)
+        if mode == 'ndjson':
+            return Response(stream_with_context(stream_ndjson(page, page.trailer)), mimetype='application/x-ndjson')
+        return Response(stream_with_context(stream_json_array(key, page, extra, page.trailer)),
+                        mimetype='application/json')
+    with stage("paginate"):
+        page, next_cursor = paginate(items, offset, limit)
+    with stage("serialize"):
+        body = json_object({**extra, "next_cursor": next_cursor}, key, page)
+    return Response(body, mimetype='application/json'), 200
+
 @app.route('/validate', methods=['POST'])
 def validate():
     try:
@@ -38,50 +137,117 @@ def query_engine():
 
 # ---- NEW ENDPOINTS ----
 @app.route('/articles', methods=['GET'])
+@cached_response(articles_version)
 def serve_articles():
     """ List all articles or filter by source, or search by query """
     try:
         query = request.args.get('query', '').strip()
         source = request.args.get('source', None)
+        offset, limit = _page_window(ARTICLES_PAGE_SIZE, MAX_SEARCH_LIMIT)
         if query:
-            articles = search_articles(query, source)
+            articles = iter_search_articles(query, source)
         else:
-            articles = get_all_articles(source)
-        return jsonify({"success": True, "articles": articles}), 200
+            articles = iter_all_articles(source)
+        return _listing_response("articles", islice(articles, offset, None), offset, limit, {"success": True})
+    except (InvalidCursor, InvalidLimit) as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
 @app.route('/articles/<source>', methods=['GET'])
+@cached_response(articles_version)
 def serve_articles_by_source(source):
     """ List all articles from a specific source only """
     try:
-        articles = get_all_articles(source)
-        return jsonify({"success": True, "articles": articles}), 200
+        offset, limit = _page_window(ARTICLES_PAGE_SIZE, MAX_SEARCH_LIMIT)
+        articles = iter_all_articles(source)
+        return _listing_response("articles", islice(articles, offset, None), offset, limit, {"success": True})
+    except (InvalidCursor, InvalidLimit) as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+@app.route('/metrics')
+def prometheus_metrics():
+    return Response(render_prometheus(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/')
 def healthcheck():
     return jsonify({"status": "Flask validator running."})
 
+def _multi_arg(name):
+    """Values of a repeatable query parameter; each may also be comma-separated."""
+    return [v.strip() for raw in request.args.getlist(name) for v in raw.split(',') if v.strip()]
+
+def _date_arg(name):
+    """Date ordinal for ?from=/?to= (YYYY-MM-DD or any corpus date format), None if absent."""
+    raw = request.args.get(name, '').strip()
+    if not raw:
+        return None
+    ordinal = parse_date_ordinal(raw)
+    if not ordinal:
+        raise ValueError(f"Unrecognised date for '{name}': {raw}")
+    return ordinal
+
 @app.route('/api/policies', methods=['GET'])
+@cached_response(_policies_version)
 def list_policies():
-    policies = policy_search_service.get_all_policies()
-    return jsonify({"policies": policies})
+    counts = policy_search_service.policy_counts()
+    return jsonify({"policies": sorted(counts), "counts": counts})
 
 @app.route('/api/search', methods=['GET'])
+@cached_response(_policies_version)
 def search_records():
     # Use unified ('indiscriminate') search
     q = request.args.get('q', '').strip()
-    # Support multi-term search by splitting, or just use [q] for single term.
-    query_terms = [term.strip() for term in q.split()] if q else None
-    results = policy_search_service.search(query_terms=query_terms)
-    return jsonify({"results": results})
+    # "quoted text" is matched as a phrase, everything else term by term.
+    phrases = PHRASE_RE.findall(q)
+    q = PHRASE_RE.sub(' ', q)
+    query_terms = [term.strip() for term in q.split()] if q.strip() else None
+    ranked = request.args.get('rank', 'bm25') != 'none' and bool(query_terms or phrases)
+    # ?policy=&name=&source= (repeatable): any value of one, all of them together
+    filters = {field: _multi_arg(param) for param, field in FACET_PARAMS.items() if _multi_arg(param)}
+    facet_fields = [FACET_PARAMS.get(f, f) for f in _multi_arg('facets')]
+    unknown = [f for f in facet_fields if f not in FACET_PARAMS.values()]
+    if unknown:
+        return jsonify({"error": f"Unknown facet: {', '.join(unknown)}"}), 400
+    try:
+        offset, limit = _page_window(DEFAULT_SEARCH_LIMIT, MAX_SEARCH_LIMIT)
+        # ?from=&to= bound the row's date, inclusive
+        date_from, date_to = _date_arg('from'), _date_arg('to')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    extra = {"limit": limit, "offset": offset}
+    if facet_fields:
+        extra["facets"] = policy_search_service.facet_counts(
+            query_terms, phrases or None, filters, facet_fields,
+            limit=request.args.get('facet_limit', type=int),
+            date_from=date_from, date_to=date_to,
+        )
+    results = policy_search_service.iter_search_json(
+        query_terms=query_terms,
+        phrases=phrases or None,
+        rank=ranked,
+        # one extra hit tells paginate whether there is a next page
+        limit=limit + 1,
+        offset=offset,
+        filters=filters,
+        date_from=date_from,
+        date_to=date_to,
+    )
+    return _listing_response("results", results, offset, limit, extra)
 
 @app.route('/api/timeline', methods=['GET'])
+@cached_response(_policies_version)
 def timeline():
-    # Returns hardcoded timeline
-    return jsonify({"timeline": get_policy_timeline()})
+    # ?policy= for one policy, else the most mentioned ones; ?from=&to= bound the events
+    try:
+        date_from, date_to = _date_arg('from'), _date_arg('to')
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    limit = request.args.get('limit', DEFAULT_TIMELINE_LIMIT, type=int)
+    policy = request.args.get('policy', '').strip() or None
+    return jsonify({"timeline": get_policy_timeline(policy, date_from, date_to, limit)})
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
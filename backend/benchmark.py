@@ -0,0 +1,340 @@
+"""Benchmarks for loading, search, facets, timelines and article search.
+
+Generates a synthetic golden_dataset (Hansard, CNA, Straits Times and Law
+Gazette CSVs with the HEADERS_MAP columns) of the requested size, runs the
+workloads against it and prints one JSON report, so runs at different sizes
+or on different commits can be diffed:
+
+    cd backend && python3 benchmark.py --rows 100000 --output bench.json
+
+Latencies are in milliseconds. peak_rss_mb is the process high-water mark
+after each workload, so it only ever grows.
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Sequence
+
+import scraped_news_service
+from scraped_news_service import search_articles
+from scraped_policies_search_service import HEADERS_MAP, PolicySearchService
+from scraped_policies_timeline_service import PolicyTimelineService
+from snapshot import read_snapshot, write_snapshot
+
+# share of rows per file
+SOURCE_MIX = {
+    "full_hansard_master.csv": 0.4,
+    "full_cna_articles.csv": 0.2,
+    "full_straits_times_articles.csv": 0.2,
+    "full_lawgaz_master.csv": 0.2,
+}
+SOURCE_NAMES = {
+    "full_hansard_master.csv": "hansard",
+    "full_cna_articles.csv": "cna",
+    "full_straits_times_articles.csv": "straits_times",
+    "full_lawgaz_master.csv": "lawgazette",
+}
+# words per row; Hansard rows are single speeches
+WORDS_PER_ROW = {
+    "full_hansard_master.csv": 150,
+    "full_cna_articles.csv": 250,
+    "full_straits_times_articles.csv": 250,
+    "full_lawgaz_master.csv": 400,
+}
+# speeches per Hansard sitting, and per section (one bill or question) of it
+SPEECHES_PER_SITTING = (5, 40)
+SPEECHES_PER_SECTION = (1, 8)
+VOCAB_SIZE = 20_000
+POLICIES = [
+    "Act", "Scheme", "Grant", "Bill", "Subsidy", "CPF", "HDB", "Levy", "Budget",
+    "Voucher", "Rebate", "Framework", "Tariff", "Fund", "Package", "Regulation",
+    "COVID-19", "Circuit Breaker", "Payout", "Bursary",
+]
+FIRST_NAMES = ["Lawrence", "Josephine", "Heng", "Ong", "Indranee", "Chan", "Grace", "Desmond",
+               "Edwin", "Gan", "Tan", "Sim", "Vivian", "Janil", "Amy", "Faishal"]
+LAST_NAMES = ["Wong", "Teo", "Swee Keat", "Ye Kung", "Rajah", "Chun Sing", "Fu", "Lee",
+              "Tong", "Kim Yong", "See Leng", "Ann", "Balakrishnan", "Puthucheary", "Khor", "Ibrahim"]
+START_DATE = date(2015, 1, 1)
+DATE_SPAN_DAYS = 10 * 365
+
+WORKLOADS = ["load", "snapshot", "search", "facets", "dates", "timeline", "ingest", "articles"]
+
+
+def _words(rng: random.Random) -> List[str]:
+    """Synthetic vocabulary; drawn with Zipf-like weights so a few terms are very common."""
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = set()
+    while len(words) < VOCAB_SIZE:
+        words.add("".join(rng.choice(letters) for _ in range(rng.randint(3, 10))))
+    return sorted(words)
+
+
+def _date_string(filename: str, day: date, rng: random.Random) -> str:
+    if filename == "full_hansard_master.csv":
+        return day.strftime("%d-%m-%Y")
+    if filename == "full_lawgaz_master.csv":
+        return day.strftime("dd%m%Y")  # month and year only, as extract_date_from_url writes it
+    # news bylines: free text, sometimes relative
+    if rng.random() < 0.05:
+        return f"{rng.randint(1, 23)} hours ago"
+    return day.strftime("%b %d, %Y") if rng.random() < 0.5 else day.isoformat() + "T08:00:00+08:00"
+
+
+def generate_corpus(directory: str, rows: int, seed: int = 0) -> Dict:
+    """Write the four golden_dataset CSVs under directory; returns the vocabulary used."""
+    rng = random.Random(seed)
+    vocab = _words(rng)
+    weights = [1.0 / (rank + 1) for rank in range(len(vocab))]
+    names = [f"{f} {l}" for f in FIRST_NAMES for l in LAST_NAMES]
+    paths = []
+    for filename, share in SOURCE_MIX.items():
+        path = os.path.join(directory, filename)
+        fieldnames = HEADERS_MAP[filename]
+        count = max(1, int(rows * share))
+        # Hansard speeches come in sittings: one date, sections in turn, Start/End into the sitting text
+        speeches_left = section = section_left = offset = 0
+        with open(path, "w", newline="", encoding="utf-8") as fout:
+            writer = csv.DictWriter(fout, fieldnames=fieldnames)
+            writer.writeheader()
+            for i in range(count):
+                n_words = max(20, int(rng.gauss(WORDS_PER_ROW[filename], WORDS_PER_ROW[filename] / 4)))
+                body = rng.choices(vocab, weights, k=n_words)
+                row_policies = rng.sample(POLICIES, rng.randint(0, 3))
+                for policy in row_policies:
+                    body.insert(rng.randrange(len(body)), policy)
+                text = " ".join(body)
+                if not speeches_left:
+                    day = START_DATE + timedelta(days=rng.randrange(DATE_SPAN_DAYS))
+                    speeches_left, section, section_left, offset = rng.randint(*SPEECHES_PER_SITTING), -1, 0, 0
+                if not section_left:
+                    section, section_left = section + 1, rng.randint(*SPEECHES_PER_SECTION)
+                    heading = " ".join(rng.choices(vocab, weights, k=5))
+                speeches_left, section_left = speeches_left - 1, section_left - 1
+                row = {
+                    "source": SOURCE_NAMES[filename],
+                    "Date": _date_string(filename, day, rng),
+                    "Section": section,
+                    "Heading": heading,
+                    "Speaker": rng.choice(names),
+                    "Start": offset,
+                    "End": offset + len(text),
+                    "Content": text,
+                    "date": _date_string(filename, day, rng),
+                    "headline": " ".join(body[:8]),
+                    "url": f"https://example.org/{SOURCE_NAMES[filename]}/{i}",
+                    "content": text,
+                    "raw_text": text,
+                    "names": ", ".join(rng.sample(names, rng.randint(0, 4))),
+                    "policies": ", ".join(row_policies),
+                }
+                offset += len(text) + 1
+                writer.writerow({k: row[k] for k in fieldnames})
+        paths.append(path)
+    return {"paths": paths, "vocab": vocab, "names": names}
+
+
+def latency_stats(samples: Sequence[float], wall: float) -> Dict:
+    ordered = sorted(samples)
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000, 3)
+
+    return {
+        "n": len(ordered),
+        "p50_ms": pct(50),
+        "p90_ms": pct(90),
+        "p99_ms": pct(99),
+        "max_ms": round(ordered[-1] * 1000, 3),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "throughput_qps": round(len(ordered) / wall, 1) if wall else None,
+    }
+
+
+def measure(fn: Callable, cases: Sequence, repeat: int = 1) -> Dict:
+    samples = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for case in cases:
+            t = time.perf_counter()
+            fn(case)
+            samples.append(time.perf_counter() - t)
+    return latency_stats(samples, time.perf_counter() - start)
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _queries(data: Dict, count: int, rng: random.Random) -> Dict[str, List]:
+    vocab = data["vocab"]
+    common, rare = vocab[:50], vocab[len(vocab) // 2:]
+    return {
+        "common_term": [[rng.choice(common)] for _ in range(count)],
+        "rare_term": [[rng.choice(rare)] for _ in range(count)],
+        "two_terms": [[rng.choice(common), rng.choice(rare)] for _ in range(count)],
+        "short_term": [[rng.choice(common)[:3]] for _ in range(count)],
+        "policy_term": [[rng.choice(POLICIES)] for _ in range(count)],
+    }
+
+
+def run(rows: int, queries: int, seed: int, workloads: List[str], directory: str) -> Dict:
+    rng = random.Random(seed)
+    report = {
+        "rows": rows,
+        "seed": seed,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "workloads": {},
+    }
+    t = time.perf_counter()
+    data = generate_corpus(directory, rows, seed)
+    report["generate_s"] = round(time.perf_counter() - t, 3)
+    report["csv_bytes"] = sum(os.path.getsize(p) for p in data["paths"])
+    results = report["workloads"]
+
+    t = time.perf_counter()
+    service = PolicySearchService(csv_paths=data["paths"])
+    load_s = time.perf_counter() - t
+    if "load" in workloads:
+        results["load"] = {"csv_parse_and_index_s": round(load_s, 3), "peak_rss_mb": peak_rss_mb()}
+
+    if "snapshot" in workloads:
+        path = os.path.join(directory, "bench.snapshot")
+        corpus, indexes = service.view.segments[0].corpus, service.view.segments[0].indexes
+        t = time.perf_counter()
+        write_snapshot(path, corpus, indexes, data["paths"])
+        write_s = time.perf_counter() - t
+        t = time.perf_counter()
+        PolicySearchService(csv_paths=[], snapshot=read_snapshot(path))
+        results["snapshot"] = {
+            "write_s": round(write_s, 3),
+            "load_s": round(time.perf_counter() - t, 3),
+            "bytes": os.path.getsize(path),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+    query_sets = _queries(data, queries, rng)
+    if "search" in workloads:
+        search = {}
+        for label, cases in query_sets.items():
+            search[label] = {
+                "ranked_top50": measure(lambda q: service.search(q, rank=True, limit=50), cases),
+                "unranked_top50": measure(lambda q: service.search(q, limit=50), cases),
+            }
+        phrases = [" ".join(data["vocab"][i:i + 2]) for i in range(queries)]
+        search["phrase"] = {"ranked_top50": measure(lambda p: service.search(phrases=[p], rank=True, limit=50), phrases)}
+        search["peak_rss_mb"] = peak_rss_mb()
+        results["search"] = search
+
+    if "facets" in workloads:
+        filters = [{"policies": [rng.choice(POLICIES)], "source": ["hansard", "cna"]} for _ in range(queries)]
+        results["facets"] = {
+            "counts_for_query": measure(lambda q: service.facet_counts(q, fields=("policies", "source")), query_sets["common_term"]),
+            "counts_all_rows": measure(lambda _: service.facet_counts(fields=("policies", "names", "source")), range(min(queries, 20))),
+            "filtered_search": measure(lambda f: service.search(filters=f, limit=50), filters),
+            "filtered_ranked_search": measure(
+                lambda case: service.search(case[0], rank=True, limit=50, filters=case[1]),
+                list(zip(query_sets["common_term"], filters)),
+            ),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+    if "dates" in workloads:
+        windows = []
+        for _ in range(queries):
+            start = START_DATE + timedelta(days=rng.randrange(DATE_SPAN_DAYS))
+            windows.append((start.toordinal(), (start + timedelta(days=rng.choice([7, 30, 365]))).toordinal()))
+        results["dates"] = {
+            "range_only": measure(lambda w: service.search(date_from=w[0], date_to=w[1], limit=50), windows),
+            "range_with_term": measure(
+                lambda case: service.search(case[0], rank=True, limit=50, date_from=case[1][0], date_to=case[1][1]),
+                list(zip(query_sets["common_term"], windows)),
+            ),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+    if "timeline" in workloads:
+        timelines = PolicyTimelineService(service)
+        cold = measure(lambda p: timelines.timeline(p), POLICIES)
+        warm = measure(lambda p: timelines.timeline(p), POLICIES, repeat=max(1, queries // len(POLICIES)))
+        windowed = measure(
+            lambda p: timelines.timeline(p, date(2018, 1, 1).toordinal(), date(2019, 12, 31).toordinal()),
+            POLICIES,
+        )
+        results["timeline"] = {"cold": cold, "warm": warm, "windowed_warm": windowed, "peak_rss_mb": peak_rss_mb()}
+
+    if "ingest" in workloads:
+        batch_rows = []
+        extra = generate_corpus(tempfile.mkdtemp(dir=directory), max(100, queries * 10), seed + 1)
+        for path in extra["paths"]:
+            with open(path, encoding="utf-8") as fin:
+                batch_rows.extend(csv.DictReader(fin))
+        batches = [batch_rows[i:i + 100] for i in range(0, len(batch_rows), 100)]
+        ingest = measure(service.ingest, batches)
+        t = time.perf_counter()
+        service.merge_deltas()
+        results["ingest"] = {
+            "batch_of_100": ingest,
+            "merge_s": round(time.perf_counter() - t, 3),
+            "search_after_ingest": measure(lambda q: service.search(q, rank=True, limit=50), query_sets["common_term"]),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+    if "articles" in workloads:
+        results["articles"] = {
+            "substring_search": measure(lambda q: search_articles(q[0]), query_sets["rare_term"][:max(1, queries // 10)]),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+    undated = sum(1 for r in range(len(service.view.corpus)) if not service.view.corpus.date_ordinals[r])
+    report["undated_rows"] = undated
+    report["peak_rss_mb"] = peak_rss_mb()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the search backend on a synthetic corpus.")
+    parser.add_argument("--rows", type=int, default=10_000, help="total rows across the four CSVs")
+    parser.add_argument("--queries", type=int, default=200, help="queries per workload")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workloads", default=",".join(WORKLOADS),
+                        help=f"comma-separated subset of {','.join(WORKLOADS)}")
+    parser.add_argument("--output", help="write the JSON report here as well as to stdout")
+    parser.add_argument("--keep", action="store_true", help="keep the generated CSVs (their directory is printed)")
+    args = parser.parse_args()
+
+    selected = [w.strip() for w in args.workloads.split(",") if w.strip()]
+    unknown = sorted(set(selected) - set(WORKLOADS))
+    if unknown:
+        parser.error(f"unknown workloads: {', '.join(unknown)}")
+    directory = tempfile.mkdtemp(prefix="policy-bench-")
+    # the article service reads these module paths on every call
+    scraped_news_service.CNA_CSV = os.path.join(directory, "full_cna_articles.csv")
+    scraped_news_service.ST_CSV = os.path.join(directory, "full_straits_times_articles.csv")
+    try:
+        report = run(args.rows, args.queries, args.seed, selected, directory)
+    finally:
+        if args.keep:
+            print(f"Generated CSVs kept in {directory}", file=sys.stderr)
+        else:
+            shutil.rmtree(directory, ignore_errors=True)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fout:
+            fout.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+import csv
+import os
+import re
+from array import array
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+CSV_PATHS = [
+    "../golden_dataset/full_hansard_master.csv",
+    "../golden_dataset/full_cna_articles.csv",
+    "../golden_dataset/full_straits_times_articles.csv",
+    "../golden_dataset/full_lawgaz_master.csv"
+]
+
+# built by `python snapshot.py`; used instead of the CSVs when it is up to date
+SNAPSHOT_PATH = os.getenv("POLICY_SNAPSHOT", "../golden_dataset/policies.snapshot")
+
+# sources whose rows link back to a public article
+URL_SOURCES = {'straitstimes', 'cna', 'straits_times', 'straits times', 'lawgazette'}
+# in a Law Gazette category page's URL, which several issues share
+CATEGORY_URL_PART = "/category/"
+
+DATE_FORMATS = [
+    "%d-%m-%Y", "%Y-%m-%d", "%d/%m/%Y",
+    # news bylines
+    "%d %b %Y", "%d %B %Y", "%b %d, %Y", "%B %d, %Y", "%b %d %Y", "%B %d %Y",
+]
+
+# an ISO date at the start of a timestamp ('2025-04-08T10:00:00+08:00')
+ISO_PREFIX_RE = re.compile(r"^(\d{4}-\d{2}-\d{2})[T ]")
+# a 'day month year' or 'month day, year' run inside free text ('Published Apr 8, 2025, 06:00 PM')
+TEXT_DATE_RE = re.compile(
+    r"\b(\d{1,2} [A-Za-z]{3,9},? \d{4}|[A-Za-z]{3,9} \d{1,2},? \d{4})\b"
+)
+
+
+def _strptime_ordinal(raw: str) -> int:
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(raw, fmt).toordinal()
+        except ValueError:
+            continue
+    return 0
+
+
+def parse_date_ordinal(raw: Optional[str]) -> int:
+    """Proleptic Gregorian ordinal for a raw corpus date, or 0 if unparseable.
+
+    Law Gazette dates only carry month and year ('dd082025'), so they map to
+    the first of that month. News timestamps may carry a time or surrounding
+    text; relative ones ('3 hours ago') cannot be placed and stay 0.
+    """
+    if not raw:
+        return 0
+    raw = raw.strip()
+    if raw.startswith("dd") and len(raw) == 8 and raw[2:].isdigit():
+        raw = "01-" + raw[2:4] + "-" + raw[4:]
+    ordinal = _strptime_ordinal(raw)
+    if ordinal:
+        return ordinal
+    match = ISO_PREFIX_RE.match(raw)
+    if match:
+        return _strptime_ordinal(match.group(1))
+    match = TEXT_DATE_RE.search(raw)
+    if match:
+        return _strptime_ordinal(match.group(1).replace(",", ""))
+    return 0
+
+
+def split_list(value: Optional[str]) -> List[str]:
+    return [v.strip() for v in (value or '').split(',') if v.strip()]
+
+
+def csv_row_fields(row: Dict[str, str]) -> Dict:
+    """Map a raw CSV row from any of the golden_dataset files onto Corpus.append's fields."""
+    # Map keys, handle URL for news sources
+    names = split_list(row.get('names'))
+    # Hansard rows are one speech each since speech segmentation; the speaker leads the names
+    speaker = (row.get('Speaker') or '').strip()
+    if speaker and speaker not in names:
+        names.insert(0, speaker)
+    return {
+        "source": row.get('source'),
+        "date": row.get('Date') or row.get('date'),
+        "content": row.get('content') or row.get('Content') or row.get('raw_text') or row.get('headline') or '',
+        "names": names,
+        "policies": split_list(row.get('policies')),
+        "url": row.get('url') or None,
+        "key": record_key(row),
+    }
+
+
+def record_key(row: Dict[str, str]) -> str:
+    """Identity of a raw CSV row, which stays the same when its text is edited.
+
+    News rows are keyed on their URL. Law Gazette rows often carry the
+    category page's URL rather than the article's, and that page is listed
+    in every issue, so those add the issue date. Hansard speeches are keyed
+    on their sitting, section and offset into it; anything else on source,
+    date and headline. Whether a known record changed is decided apart
+    from this, by comparing its fields.
+    """
+    url = row.get('url')
+    date = row.get('Date') or row.get('date') or ''
+    if url:
+        return f"{url}|{date}" if CATEGORY_URL_PART in url else url
+    if row.get('Section') or row.get('Start'):
+        return f"{row.get('source') or ''}|{date}|{row.get('Section') or ''}|{row.get('Start') or ''}"
+    return f"{row.get('source') or ''}|{date}|{row.get('headline') or ''}"
+
+
+class Vocab:
+    """Interned strings <-> dense integer ids. Id 0 is reserved for None."""
+
+    def __init__(self):
+        self.strings: List[Optional[str]] = [None]
+        self.ids: Dict[str, int] = {}
+
+    @classmethod
+    def from_strings(cls, strings: List[Optional[str]]) -> "Vocab":
+        vocab = cls()
+        vocab.strings = list(strings)
+        vocab.ids = {s: i for i, s in enumerate(vocab.strings) if i}
+        return vocab
+
+    def add(self, value: Optional[str]) -> int:
+        if value is None:
+            return 0
+        term_id = self.ids.get(value)
+        if term_id is None:
+            term_id = len(self.strings)
+            self.strings.append(value)
+            self.ids[value] = term_id
+        return term_id
+
+    def __getitem__(self, term_id: int) -> Optional[str]:
+        return self.strings[term_id]
+
+    def __len__(self) -> int:
+        return len(self.strings) - 1
+
+
+class TextColumn:
+    """All values of one text field in a single UTF-8 buffer plus row offsets."""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.offsets = array('Q', [0])
+
+    def append(self, value: Optional[str]):
+        self.buffer += (value or '').encode('utf-8')
+        self.offsets.append(len(self.buffer))
+
+    def __getitem__(self, row_id: int) -> str:
+        # str() rather than .decode() so a memoryview buffer works too
+        return str(self.buffer[self.offsets[row_id]:self.offsets[row_id + 1]], 'utf-8')
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+
+class ListColumn:
+    """Variable-length lists of vocab ids per row (CSR layout)."""
+
+    def __init__(self, vocab: Vocab):
+        self.vocab = vocab
+        self.ids = array('I')
+        self.offsets = array('I', [0])
+
+    def append(self, values: Iterable[str]):
+        self.ids.extend(self.vocab.add(v) for v in values)
+        self.offsets.append(len(self.ids))
+
+    def row_ids(self, row_id: int) -> array:
+        return self.ids[self.offsets[row_id]:self.offsets[row_id + 1]]
+
+    def __getitem__(self, row_id: int) -> List[str]:
+        return [self.vocab[i] for i in self.row_ids(row_id)]
+
+
+class Corpus:
+    """Columnar, append-only store of the golden dataset.
+
+    Rows are never kept as dicts: repeated strings (sources, dates, names,
+    policies) are interned into vocabularies and referenced by integer ids,
+    free text lives in contiguous UTF-8 buffers, and dates are also kept as
+    ordinals for range filters. Use row() to materialize a dict when a
+    result is serialized.
+    """
+
+    # array-backed attributes, in the order a snapshot stores them
+    ARRAY_COLUMNS = [
+        "source_ids", "date_ids", "date_ordinals",
+        "content.buffer", "content.offsets", "urls.buffer", "urls.offsets", "keys.buffer", "keys.offsets",
+        "names.ids", "names.offsets", "policies.ids", "policies.offsets",
+    ]
+    VOCABS = ["source_vocab", "date_vocab", "name_vocab", "policy_vocab"]
+
+    def __init__(self):
+        self.source_vocab = Vocab()
+        self.date_vocab = Vocab()
+        self.name_vocab = Vocab()
+        self.policy_vocab = Vocab()
+        self.source_ids = array('I')
+        self.date_ids = array('I')
+        self.date_ordinals = array('i')
+        self.content = TextColumn()
+        self.urls = TextColumn()
+        self.keys = TextColumn()
+        self.names = ListColumn(self.name_vocab)
+        self.policies = ListColumn(self.policy_vocab)
+
+    def __len__(self) -> int:
+        return len(self.source_ids)
+
+    def append(self, source, date, content, names, policies, url=None, key=None) -> int:
+        row_id = len(self)
+        self.source_ids.append(self.source_vocab.add(source))
+        self.date_ids.append(self.date_vocab.add(date))
+        self.date_ordinals.append(parse_date_ordinal(date))
+        self.content.append(content)
+        self.urls.append(url)
+        self.keys.append(key)
+        self.names.append(names)
+        self.policies.append(policies)
+        return row_id
+
+    def append_csv_row(self, row: Dict[str, str]) -> int:
+        return self.append(**csv_row_fields(row))
+
+    def load_csv(self, path: str):
+        # utf-8-sig: the Law Gazette CSV starts with a BOM, which would otherwise hide its 'source' column
+        with open(path, encoding="utf-8-sig") as fin:
+            for row in csv.DictReader(fin):
+                self.append_csv_row(row)
+
+    def source(self, row_id: int) -> Optional[str]:
+        return self.source_vocab[self.source_ids[row_id]]
+
+    def date(self, row_id: int) -> Optional[str]:
+        return self.date_vocab[self.date_ids[row_id]]
+
+    def url(self, row_id: int) -> Optional[str]:
+        return self.urls[row_id] or None
+
+    def searchable_fields(self, row_id: int) -> List[str]:
+        return (
+            [self.date(row_id) or '', self.source(row_id) or '', self.content[row_id]]
+            + self.names[row_id] + self.policies[row_id]
+        )
+
+    def row(self, row_id: int) -> Dict:
+        return {
+            "source": self.source(row_id),
+            "date": self.date(row_id),
+            "content": self.content[row_id],
+            "names": self.names[row_id],
+            "policies": self.policies[row_id],
+            "url": self.url(row_id),
+            "key": self.key(row_id),
+        }
+
+    def key(self, row_id: int) -> str:
+        """The row's record_key, as given to append()."""
+        return self.keys[row_id]
@@ -0,0 +1,162 @@
+"""Policy / name / source facets and date ranges over row ids.
+
+Each facet value keeps the rows that carry it either as an ascending
+array of row ids or, once it is on at least 1/DENSE_RATIO of the rows, as
+a Python int whose bit i is set when row i has it; at that density the
+bitmap is no bigger than the array. Filters are ANDs and ORs of bitmaps.
+A value's count within a result is a popcount when its rows are dense and
+a set intersection when they are sparse; when the result has fewer rows
+than the field has values, its rows are walked instead and each row's
+values read from the corpus. Date ranges come from rows sorted by date
+ordinal: two bisections and a slice. All of it is built per corpus
+segment on first use and shifted into global row ids by the segmented
+view.
+"""
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+FACET_FIELDS = ("policies", "names", "source")
+# a value on at least 1/DENSE_RATIO of the rows is kept as a bitmap: N/8 bytes against 4 per row id
+DENSE_RATIO = 32
+
+# rows carrying one value: ascending row ids, or a bitmap when dense
+Postings = Union[array, int]
+
+_NONZERO_BYTE = re.compile(rb"[^\x00]")
+_BITS = [tuple(bit for bit in range(8) if byte >> bit & 1) for byte in range(256)]
+
+
+def rows_to_bitmap(row_ids: Iterable[int]) -> int:
+    row_ids = list(row_ids)
+    if not row_ids:
+        return 0
+    buf = bytearray((max(row_ids) >> 3) + 1)
+    for row_id in row_ids:
+        buf[row_id >> 3] |= 1 << (row_id & 7)
+    return int.from_bytes(buf, "little")
+
+
+def bitmap_rows(bitmap: int) -> Iterator[int]:
+    """Row ids set in bitmap, ascending."""
+    buf = bitmap.to_bytes((bitmap.bit_length() + 7) >> 3, "little")
+    # regex skips runs of empty bytes at C speed
+    for match in _NONZERO_BYTE.finditer(buf):
+        base = match.start() << 3
+        for bit in _BITS[buf[match.start()]]:
+            yield base + bit
+
+
+def pack_rows(row_ids: List[int], num_rows: int) -> Postings:
+    """Ascending row ids as an array, or as a bitmap once they are 1/DENSE_RATIO of num_rows."""
+    if len(row_ids) * DENSE_RATIO >= num_rows:
+        return rows_to_bitmap(row_ids)
+    return array('I', row_ids)
+
+
+def postings_bitmap(postings: Postings) -> int:
+    return postings if isinstance(postings, int) else rows_to_bitmap(postings)
+
+
+class FacetIndex:
+    """value -> rows carrying it, for one field of one Corpus.
+
+    row_values(row_id), when given, returns one row's values; count() walks
+    the rows with it when there are fewer of them than values.
+    """
+
+    def __init__(self, postings: Dict[str, Postings],
+                 row_values: Optional[Callable[[int], Iterable[Optional[str]]]] = None):
+        self.postings = postings
+        self.row_values = row_values
+        self._folded: Dict[str, List[str]] = {}
+        for value in postings:
+            self._folded.setdefault(value.casefold(), []).append(value)
+
+    @classmethod
+    def from_corpus(cls, corpus, field: str) -> "FacetIndex":
+        groups: Dict[int, List[int]] = {}
+        if field == "source":
+            source_ids, vocab = corpus.source_ids, corpus.source_vocab
+            for row_id, value_id in enumerate(source_ids):
+                groups.setdefault(value_id, []).append(row_id)
+
+            def row_values(row_id):
+                return (vocab[source_ids[row_id]],)
+        else:
+            column = getattr(corpus, field)
+            ids, offsets, vocab = column.ids, column.offsets, column.vocab
+            for row_id in range(len(corpus)):
+                for value_id in ids[offsets[row_id]:offsets[row_id + 1]]:
+                    rows = groups.setdefault(value_id, [])
+                    # a value listed twice on one row still counts that row once
+                    if not rows or rows[-1] != row_id:
+                        rows.append(row_id)
+
+            def row_values(row_id):
+                return {vocab[i] for i in ids[offsets[row_id]:offsets[row_id + 1]]}
+        return cls({
+            vocab[value_id]: pack_rows(rows, len(corpus))
+            for value_id, rows in groups.items() if vocab[value_id]
+        }, row_values)
+
+    def values(self) -> Iterable[str]:
+        return self.postings.keys()
+
+    def get(self, value: str) -> int:
+        """Bitmap of the rows with value."""
+        return postings_bitmap(self.postings.get(value, 0))
+
+    def match(self, value: str) -> int:
+        """Bitmap of the rows with value, ignoring case ("cna" also matches "CNA")."""
+        bitmap = 0
+        for original in self._folded.get(value.casefold(), ()):
+            bitmap |= postings_bitmap(self.postings[original])
+        return bitmap
+
+    def count(self, rows: int, counts: Counter) -> Counter:
+        """Add how many of rows (a bitmap) carry each value to counts."""
+        if self.row_values is not None and rows.bit_count() < len(self.postings):
+            for row_id in bitmap_rows(rows):
+                counts.update(value for value in self.row_values(row_id) if value)
+            return counts
+        members = None
+        for value, postings in self.postings.items():
+            if isinstance(postings, int):
+                count = (postings & rows).bit_count()
+            else:
+                if members is None:
+                    members = set(bitmap_rows(rows))
+                count = len(members.intersection(postings))
+            if count:
+                counts[value] += count
+        return counts
+
+
+def count_values(counts: Dict[str, int], limit: Optional[int] = None) -> List[Tuple[str, int]]:
+    """(value, count) pairs, most common first, zero counts dropped."""
+    counts = sorted((c for c in counts.items() if c[1]), key=lambda c: (-c[1], c[0]))
+    return counts if limit is None else counts[:limit]
+
+
+class DateIndex:
+    """Row ids sorted by date ordinal, for one Corpus. Undated rows are left out."""
+
+    def __init__(self, ordinals: array, rows: array):
+        self.ordinals = ordinals
+        self.rows = rows
+
+    @classmethod
+    def from_corpus(cls, corpus) -> "DateIndex":
+        dated = sorted(
+            (ordinal, row_id) for row_id, ordinal in enumerate(corpus.date_ordinals) if ordinal
+        )
+        return cls(array('i', (o for o, _ in dated)), array('I', (r for _, r in dated)))
+
+    def between(self, start: Optional[int] = None, end: Optional[int] = None) -> int:
+        """Bitmap of rows dated within [start, end] (ordinals, either end open if None)."""
+        lo = 0 if start is None else bisect_left(self.ordinals, start)
+        hi = len(self.ordinals) if end is None else bisect_right(self.ordinals, end)
+        return rows_to_bitmap(self.rows[lo:hi]) if lo < hi else 0
@@ -0,0 +1,25 @@
+# gunicorn -c gunicorn.conf.py app:app
+# The master publishes the search corpus into shared memory before forking,
+# and every worker attaches to that one copy (see shared_corpus.py).
+import multiprocessing
+import os
+
+from shared_corpus import SHM_NAME_ENV, publish
+
+bind = "0.0.0.0:5000"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+
+_segment = None
+
+
+def on_starting(server):
+    global _segment
+    _segment = publish(os.getenv(SHM_NAME_ENV))
+    os.environ[SHM_NAME_ENV] = _segment.name
+    server.log.info("Published search corpus as shared memory %s (%d bytes)", _segment.name, _segment.size)
+
+
+def on_exit(server):
+    if _segment is not None:
+        _segment.close()
+        _segment.unlink()
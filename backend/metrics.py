@@ -0,0 +1,215 @@
+"""Stage timers, counters and an opt-in sampling profiler for the backend.
+
+Everything is process-local and stdlib-only. render_prometheus() produces
+the text exposition format served at /metrics. Under gunicorn each worker
+keeps its own numbers, so scrape every worker or expect per-worker values.
+
+POLICY_METRICS=0 turns recording off. stage() then hands back one shared
+no-op context manager, and inc()/observe() return on their first line, so
+the hot paths pay only a function call. The profiler only ever runs for a
+request that asks for it, and only when POLICY_PROFILING=1.
+"""
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import nullcontext
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+
+ENABLED = os.getenv("POLICY_METRICS", "1") != "0"
+PROFILING_ENABLED = os.getenv("POLICY_PROFILING") == "1"
+PROFILE_INTERVAL = float(os.getenv("POLICY_PROFILE_INTERVAL", 0.001))
+
+# seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    "policy_stage_seconds": "Time spent in one stage of loading or answering a query.",
+    "policy_search_rows_scanned_total": "Candidate rows verified against a substring term.",
+    "policy_search_hits_total": "Rows matched by searches, before limit/offset.",
+    "http_requests_total": "Requests handled, by endpoint and status.",
+    "http_request_duration_seconds": "Wall time from request start to response, by endpoint.",
+    "http_response_bytes_total": "Response body bytes serialized (streamed bodies excluded).",
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+_NULL = nullcontext()
+# (stage, seconds) pairs for the request being handled, for Server-Timing
+_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("policy_stage_timings", default=None)
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        # name, labels -> [count per bucket..., +Inf count, sum]
+        self.histograms: Dict[Tuple[str, Labels], List[float]] = {}
+        self.gauges: Dict[str, Callable[[], Dict[Labels, float]]] = {}
+
+    def inc(self, name: str, value: float, labels: Labels):
+        key = (name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, labels: Labels):
+        key = (name, labels)
+        with self._lock:
+            series = self.histograms.get(key)
+            if series is None:
+                series = self.histograms[key] = [0] * (len(BUCKETS) + 2)
+            series[bisect_left(BUCKETS, seconds)] += 1
+            series[-1] += seconds
+
+    def gauge(self, name: str, read: Callable[[], Dict[Labels, float]], help_text: str = ""):
+        """Register a value read at scrape time; read() returns {labels: value}."""
+        self.gauges[name] = read
+        if help_text:
+            HELP[name] = help_text
+
+
+registry = Registry()
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name: str, value: float = 1, **labels):
+    if ENABLED:
+        registry.inc(name, value, _labels(labels))
+
+
+def observe(name: str, seconds: float, **labels):
+    if ENABLED:
+        registry.observe(name, seconds, _labels(labels))
+
+
+class _Stage:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record_stage(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def stage(name: str):
+    """with stage("match"): ... -- times the block into policy_stage_seconds{stage=name}."""
+    return _Stage(name) if ENABLED else _NULL
+
+
+def record_stage(name: str, seconds: float):
+    """For time accumulated by hand, e.g. across a generator's yields."""
+    if not ENABLED:
+        return
+    registry.observe("policy_stage_seconds", seconds, (("stage", name),))
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+def start_request_timings():
+    if ENABLED:
+        _timings.set([])
+
+
+def server_timing_header() -> Optional[str]:
+    """Server-Timing value for the stages recorded in this request so far."""
+    timings = _timings.get()
+    if not timings:
+        return None
+    totals: Dict[str, float] = {}
+    for name, seconds in timings:
+        totals[name] = totals.get(name, 0.0) + seconds
+    return ", ".join(f"{name};dur={seconds * 1000:.3f}" for name, seconds in totals.items())
+
+
+def _format_labels(labels: Labels, extra: Labels = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    escaped = (
+        (k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for k, v in pairs
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+def render_prometheus() -> str:
+    with registry._lock:
+        counters = dict(registry.counters)
+        histograms = {key: list(series) for key, series in registry.histograms.items()}
+    lines = []
+    seen = set()
+
+    def header(name: str, kind: str):
+        if name not in seen:
+            seen.add(name)
+            if name in HELP:
+                lines.append(f"# HELP {name} {HELP[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in sorted(counters.items()):
+        header(name, "counter")
+        lines.append(f"{name}{_format_labels(labels)} {value:g}")
+    for (name, labels), series in sorted(histograms.items()):
+        header(name, "histogram")
+        cumulative = 0
+        for bound, count in zip(BUCKETS + (float("inf"),), series):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else f"{bound:g}"
+            lines.append(f"{name}_bucket{_format_labels(labels, (('le', le),))} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {series[-1]:.6f}")
+        lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+    for name, read in sorted(registry.gauges.items()):
+        header(name, "gauge")
+        for labels, value in read().items():
+            lines.append(f"{name}{_format_labels(labels)} {value:g}")
+    return "\n".join(lines) + "\n"
+
+
+class SamplingProfiler:
+    """Samples one thread's stack every interval seconds while running.
+
+    collapsed() returns 'outer;inner;leaf count' lines, the input format of
+    flamegraph.pl, speedscope and most other flame graph viewers.
+    """
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = PROFILE_INTERVAL):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.samples[";".join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
@@ -0,0 +1,97 @@
+import base64
+import json
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from serialization import Encodable, dumps, encode
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class InvalidLimit(ValueError):
+    pass
+
+
+def encode_cursor(offset: int) -> str:
+    """Opaque cursor for the next page; clients should pass it back unmodified."""
+    raw = json.dumps({"o": offset}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> int:
+    if not cursor:
+        return 0
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        offset = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))["o"]
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor(f"invalid cursor: {cursor}") from e
+    if not isinstance(offset, int) or offset < 0:
+        raise InvalidCursor(f"invalid cursor: {cursor}")
+    return offset
+
+
+def paginate(items: Iterable[Dict], offset: int, limit: Optional[int]) -> Tuple[List[Dict], Optional[str]]:
+    """Take one page from an iterable that already starts at offset.
+
+    Reads a single item past the page to know whether there is a next one,
+    so the iterable is never consumed beyond limit + 1. With no limit the
+    rest of the iterable is returned and there is no next cursor.
+    """
+    if limit is None:
+        return list(items), None
+    page = list(islice(items, limit + 1))
+    next_cursor = encode_cursor(offset + limit) if len(page) > limit else None
+    return page[:limit], next_cursor
+
+
+class PageStream:
+    """paginate() for streaming: yields the page lazily and sets next_cursor
+    once it has been read through (reading one item past it, as paginate does)."""
+
+    def __init__(self, items: Iterable[Encodable], offset: int, limit: int):
+        self.items = items
+        self.offset = offset
+        self.limit = limit
+        self.next_cursor: Optional[str] = None
+
+    def __iter__(self) -> Iterator[Encodable]:
+        items = iter(self.items)
+        yield from islice(items, self.limit)
+        if next(items, None) is not None:
+            self.next_cursor = encode_cursor(self.offset + self.limit)
+
+    def trailer(self) -> Dict:
+        return {"next_cursor": self.next_cursor}
+
+
+def stream_ndjson(items: Iterable[Encodable], trailer: Callable[[], Dict] = None) -> Iterator[bytes]:
+    """One JSON value per line; trailer(), when given, is called after the
+    last item and its result written as the final line."""
+    for item in items:
+        yield encode(item) + b"\n"
+    if trailer is not None:
+        yield dumps(trailer()) + b"\n"
+
+
+def stream_json_array(key: str, items: Iterable[Encodable], extra: Dict = None,
+                      trailer: Callable[[], Dict] = None) -> Iterator[bytes]:
+    """Chunked '{"<key>": [...], **extra, **trailer()}' without building the list first.
+
+    items may be dicts or already-encoded JSON bytes. trailer() is called
+    once the items are written, for fields only known then.
+    """
+    yield b"{" + dumps(key) + b":["
+    first = True
+    for item in items:
+        yield (b"" if first else b",") + encode(item)
+        first = False
+    yield b"]"
+    fields = dict(extra or {})
+    if trailer is not None:
+        fields.update(trailer())
+    for k, v in fields.items():
+        yield b"," + dumps(k) + b":" + dumps(v)
+    yield b"}"
@@ -0,0 +1,133 @@
+"""Query-result cache and HTTP revalidation for the read-only JSON endpoints.
+
+Responses are cached as rendered bytes in a bounded LRU (entry count, total
+bytes and a TTL). The key is the route, the normalized query string and a
+data version: the search service's generation, or the article CSVs'
+signatures. Ingesting records therefore simply stops old keys from matching.
+The same key hashed gives the ETag, so an If-None-Match/If-Modified-Since
+revalidation is answered with 304 before the view runs at all.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import wraps
+from typing import Callable, Optional, Tuple
+
+from flask import Response, make_response, request
+from werkzeug.http import is_resource_modified
+
+QUERY_CACHE_ENTRIES = int(os.getenv("QUERY_CACHE_ENTRIES", 512))
+QUERY_CACHE_BYTES = int(os.getenv("QUERY_CACHE_BYTES", 64 * 1024 * 1024))
+QUERY_CACHE_TTL = float(os.getenv("QUERY_CACHE_TTL", 300))
+
+
+class QueryCache:
+    """Thread-safe LRU bounded by entry count and total size, with a TTL."""
+
+    def __init__(self, max_entries: int = QUERY_CACHE_ENTRIES, max_bytes: int = QUERY_CACHE_BYTES,
+                 ttl: float = QUERY_CACHE_TTL):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, int, object]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key: str, value, size: int):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, size, value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+query_cache = QueryCache()
+
+
+def normalized_query() -> str:
+    """The request's query string with args sorted and values stripped,
+    blank ones dropped, so equivalent requests share a key.
+
+    Values keep their case: responses echo some of them (the timeline's
+    policy), so two spellings must not share a cached body.
+    """
+    args = []
+    for name, value in request.args.items(multi=True):
+        value = value.strip()
+        if value:
+            args.append((name, value))
+    return "&".join(f"{name}={value}" for name, value in sorted(args))
+
+
+def cached_response(version: Callable[[], Tuple[object, Optional[float]]], cache: QueryCache = query_cache):
+    """Serve a GET view from cache, with ETag/Last-Modified and 304s.
+
+    version() returns (token, last_modified unix time) for the data the view
+    reads; the token must change whenever that data does. Only 200 responses
+    are stored, and streamed ones (?stream=) are validated but never stored.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            token, modified_at = version()
+            key = f"{request.path}?{normalized_query()}#{token}"
+            etag = hashlib.sha1(key.encode("utf-8")).hexdigest()
+            last_modified = (
+                datetime.fromtimestamp(modified_at, timezone.utc).replace(microsecond=0)
+                if modified_at else None
+            )
+            if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+                response = Response(status=304)
+            else:
+                streamed = bool(request.args.get("stream"))
+                cached = None if streamed else cache.get(key)
+                if cached is not None:
+                    body, mimetype = cached
+                    response = Response(body, mimetype=mimetype)
+                else:
+                    response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    if not streamed:
+                        body = response.get_data()
+                        cache.put(key, (body, response.mimetype), len(body))
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            # browsers and the frontend's polling must revalidate every time
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
@@ -1,38 +1,119 @@
 import csv
 import os
+import threading
+from typing import Dict, Iterator, NamedTuple, Optional, Tuple
+
+from metrics import stage
 
 # Paths to your CSV files, adjust as necessary.
 CNA_CSV = os.getenv("CNA_CSV", "full_cna_articles.csv")
 ST_CSV = os.getenv("ST_CSV", "full_straits_times_articles.csv")
 
+class _ParsedCSV(NamedTuple):
+    signature: Tuple[int, int]  # (mtime_ns, size) when parsed
+    fieldnames: Tuple[str, ...]
+    rows: Tuple[Tuple[Optional[str], ...], ...]
+
+
+class ArticleStore:
+    """Process-wide cache of parsed article CSVs.
+
+    Each file is parsed once into immutable tuples and only re-parsed when
+    its mtime or size changes, so a request costs one os.stat per file
+    instead of a full read and CSV parse. A reload builds the new snapshot
+    off to the side and swaps it in with a single assignment, so readers
+    never see a half-loaded file.
+    """
+
+    def __init__(self):
+        self._files: Dict[str, _ParsedCSV] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _signature(csv_path) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(csv_path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    @staticmethod
+    def _parse(csv_path, signature) -> _ParsedCSV:
+        with open(csv_path, encoding="utf-8", newline="") as f:
+            reader = csv.reader(f)
+            fieldnames = tuple(next(reader, ()))
+            width = len(fieldnames)
+            rows = []
+            for values in reader:
+                if not values:
+                    continue
+                # pad short rows like csv.DictReader does
+                if len(values) < width:
+                    values = values + [None] * (width - len(values))
+                rows.append(tuple(values[:width]))
+        return _ParsedCSV(signature, fieldnames, tuple(rows))
+
+    def get(self, csv_path) -> Optional[_ParsedCSV]:
+        signature = self._signature(csv_path)
+        if signature is None:
+            self._files.pop(csv_path, None)
+            return None
+        parsed = self._files.get(csv_path)
+        if parsed is not None and parsed.signature == signature:
+            return parsed
+        with self._lock:
+            # another thread may have reloaded while we waited
+            parsed = self._files.get(csv_path)
+            if parsed is None or parsed.signature != signature:
+                with stage("parse_articles_csv"):
+                    parsed = self._parse(csv_path, signature)
+                self._files[csv_path] = parsed
+        return parsed
+
+    def iter_records(self, csv_path) -> Iterator[Dict[str, Optional[str]]]:
+        parsed = self.get(csv_path)
+        if parsed is None:
+            return
+        fieldnames = parsed.fieldnames
+        for values in parsed.rows:
+            yield dict(zip(fieldnames, values))
+
+
+article_store = ArticleStore()
+
+def articles_version(paths=(CNA_CSV, ST_CSV)):
+    """(token, last modified unix time) for the article CSVs; the token changes when any file does."""
+    signatures = tuple(ArticleStore._signature(path) for path in paths)
+    mtimes = [sig[0] for sig in signatures if sig]
+    return signatures, max(mtimes) / 1e9 if mtimes else None
+
+def iter_articles_from_csv(csv_path):
+    yield from article_store.iter_records(csv_path)
+
 def load_articles_from_csv(csv_path):
-    articles = []
-    if not os.path.exists(csv_path):
-        return articles
-    with open(csv_path, encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            articles.append(row)
-    return articles
+    return list(iter_articles_from_csv(csv_path))
 
-def get_all_articles(source=None):
-    articles = []
+def iter_all_articles(source=None):
     if source is None or source.lower() == "cna":
-        articles.extend(load_articles_from_csv(CNA_CSV))
+        yield from iter_articles_from_csv(CNA_CSV)
     if source is None or source.lower() in ["straitstimes", "str", "st"]:
-        articles.extend(load_articles_from_csv(ST_CSV))
-    return articles
+        yield from iter_articles_from_csv(ST_CSV)
 
-def search_articles(query, source=None):
-    articles = get_all_articles(source)
+def get_all_articles(source=None):
+    return list(iter_all_articles(source))
+
+def iter_search_articles(query, source=None):
+    articles = iter_all_articles(source)
     if not query:
-        return articles
-    result = []
+        yield from articles
+        return
     query_lower = query.lower()
     for article in articles:
         if (
             query_lower in (article.get("headline") or "").lower()
             or query_lower in (article.get("raw_text") or "").lower()
         ):
-            result.append(article)
-    return result
\ No newline at end of file
+            yield article
+
+def search_articles(query, source=None):
+    return list(iter_search_articles(query, source))
@@ -1,88 +1,495 @@
 import csv
-from typing import List, Dict
-
-CSV_PATHS = [
-    "../golden_dataset/full_hansard_master.csv",
-    "../golden_dataset/full_cna_articles.csv",
-    "../golden_dataset/full_straits_times_articles.csv",
-    "../golden_dataset/full_lawgaz_master.csv"
-]
+import heapq
+import io
+import os
+import threading
+import time
+from typing import List, Dict, Iterable, Iterator, Optional
+from corpus import CSV_PATHS, SNAPSHOT_PATH, Corpus, URL_SOURCES, csv_row_fields
+from facets import FACET_FIELDS, bitmap_rows, rows_to_bitmap
+from metrics import ENABLED as METRICS_ENABLED, inc, record_stage, stage
+from search_index import build_indexes, tokenize
+from segments import Segment, SearchView, segment_row_json
+from serialization import with_field
+from shared_corpus import attach, attached_name
+from snapshot import SnapshotError, read_snapshot, snapshot_is_fresh
 
 HEADERS_MAP = {
-    "full_hansard_master.csv": ["source", "Date", "content", "names", "policies"],
+    # one row per speech (hansardscrape.SPEECH_FIELDS, annotated)
+    "full_hansard_master.csv": ["source", "Date", "Section", "Heading", "Speaker", "Start", "End", "Content",
+                                "names", "policies"],
     "full_cna_articles.csv": ["source", "headline", "url", "date", "raw_text", "names", "policies"],
     "full_straits_times_articles.csv": ["source", "headline", "url", "date", "raw_text", "names", "policies"],
     "full_lawgaz_master.csv": ["source", "headline", "url" , "date", "content", "names", "policies"]
 }
 
+# BM25 over content dominates; speaker and policy hits nudge the ranking
+FIELD_BOOSTS = {
+    "content": 1.0,
+    "names": 0.3,
+    "policies": 0.3,
+}
+
+# merge delta segments once this many have piled up behind the bulk segment
+MAX_DELTA_SEGMENTS = 8
+
 class PolicySearchService:
-    def __init__(self, csv_paths=CSV_PATHS):
-        self.data = self._load_csvs(csv_paths)
+    def __init__(self, csv_paths=CSV_PATHS, snapshot=None):
+        """Load from CSVs, or from a (corpus, indexes) pair read out of a snapshot."""
+        if snapshot is not None:
+            corpus, indexes = snapshot
+        else:
+            with stage("load_csv"):
+                corpus = self._load_csvs(csv_paths)
+            with stage("build_indexes"):
+                indexes = build_indexes(corpus)
+        self.view = SearchView([Segment(corpus, indexes, 0)])
+        # bumped on every ingest/delete/merge; cached answers keyed on it go stale
+        self.generation = 0
+        self.updated_at = time.time()
+        self._lock = threading.Lock()
+        self._keys: Optional[Dict[str, int]] = None
+        self._merging = False
+        # path -> (inode, byte offset already indexed)
+        self._tails = {path: self._end_of(path) for path in csv_paths if os.path.exists(path)}
 
-    def _load_csvs(self, paths: List[str]) -> List[Dict]:
-        rows = []
+    @classmethod
+    def from_snapshot(cls, path: str) -> "PolicySearchService":
+        return cls(snapshot=read_snapshot(path))
+
+    def _load_csvs(self, paths: List[str]) -> Corpus:
+        corpus = Corpus()
         for path in paths:
-            file_key = path.split("/")[-1]
-            headers = HEADERS_MAP[file_key] if file_key in HEADERS_MAP else []
-            with open(path, encoding="utf-8") as fin:
-                reader = csv.DictReader(fin)
-                for row in reader:
-                    row_standard = {}
-                    # Map keys, handle URL for news sources
-                    row_standard['source'] = row.get('source')
-                    row_standard['date'] = row.get('Date') or row.get('date')
-                    row_standard['content'] = row.get('content') or row.get('raw_text') or row.get('headline')
-                    row_standard['names'] = [n.strip() for n in row.get('names', '').split(',') if n.strip()]
-                    row_standard['policies'] = [p.strip() for p in row.get('policies', '').split(',') if p.strip()]
-                    row_standard['url'] = row.get('url') if 'url' in row else None
-                    rows.append(row_standard)
-        return rows
+            corpus.load_csv(path)
+        return corpus
+
+    # the current view's parts, for callers that predate segments
+    @property
+    def corpus(self):
+        return self.view.corpus
+
+    @property
+    def content_index(self):
+        return self.view.content_index
+
+    @property
+    def names_index(self):
+        return self.view.names_index
+
+    @property
+    def policies_index(self):
+        return self.view.policies_index
+
+    @property
+    def substring_index(self):
+        return self.view.substring_index
 
     def get_all_policies(self) -> List[str]:
-        policies = set()
-        for row in self.data:
-            policies.update(row['policies'])
-        return sorted([p for p in policies if p])
-
-    def search(self, query_terms: List[str] = None) -> List[Dict]:
-        if not query_terms:
-            return [
-                self._format_result(row)
-                for row in self.data
+        return sorted(self.policy_counts())
+
+    def policy_counts(self) -> Dict[str, int]:
+        """Policy -> number of live rows mentioning it."""
+        view = self.view
+        return dict(view.facets["policies"].count(view.live_bitmap()))
+
+    # -- incremental updates -------------------------------------------------
+
+    def _record_keys(self, view: SearchView) -> Dict[str, int]:
+        """record_key -> live row id, built on the first update. Call with the lock held."""
+        if self._keys is None:
+            self._keys = {view.corpus.key(r): r for r in view.live_range()}
+        return self._keys
+
+    def _publish(self, segments: List[Segment], deleted) -> None:
+        self.view = SearchView(segments, frozenset(deleted))
+        self.generation += 1
+        self.updated_at = time.time()
+
+    def ingest(self, records: Iterable[Dict[str, str]]) -> int:
+        """Index CSV rows without rebuilding the corpus; returns how many were indexed.
+
+        A row with the same record_key as an indexed one replaces it (an
+        edited text, say, or re-annotated names/policies), unless none of its
+        fields changed, in which case it is skipped. New rows get their own small segment, built before the
+        lock is taken so queries keep running meanwhile.
+        """
+        batch = {}
+        for fields in map(csv_row_fields, records):
+            batch[fields["key"]] = fields  # the last version of a record wins
+        with self._lock:
+            view = self.view
+            keys = self._record_keys(view)
+            fresh = [
+                (key, fields) for key, fields in batch.items()
+                if key not in keys or view.corpus.row(keys[key]) != fields
+            ]
+        if not fresh:
+            return 0
+        corpus = Corpus()
+        for _, fields in fresh:
+            corpus.append(**fields)
+        indexes = build_indexes(corpus)
+
+        with self._lock:
+            view = self.view
+            keys = self._record_keys(view)
+            base = len(view.corpus)
+            deleted = set(view.deleted)
+            for local, (key, _) in enumerate(fresh):
+                if key in keys:
+                    deleted.add(keys[key])
+                keys[key] = base + local
+            self._publish(view.segments + [Segment(corpus, indexes, base)], deleted)
+            merge = len(self.view.segments) - 1 > MAX_DELTA_SEGMENTS and not self._merging
+            self._merging = self._merging or merge
+        if merge:
+            threading.Thread(target=self._merge_in_background, daemon=True).start()
+        return len(fresh)
+
+    def delete(self, keys: Iterable[str]) -> int:
+        """Drop rows by record_key; they stay in their segment until the next merge."""
+        with self._lock:
+            view = self.view
+            known = self._record_keys(view)
+            row_ids = [known.pop(k) for k in keys if k in known]
+            if row_ids:
+                self._publish(view.segments, view.deleted.union(row_ids))
+        return len(row_ids)
+
+    def _merge_in_background(self):
+        try:
+            self.merge_deltas()
+        finally:
+            self._merging = False
+
+    def merge_deltas(self) -> None:
+        """Fold every delta segment into one, dropping their deleted rows.
+
+        The bulk segment is left alone: it may be a read-only mapped
+        snapshot, and rebuilding it is what a fresh snapshot is for. The
+        merge holds the write lock, so it never races another merge (the
+        background one and an explicit call) or an ingest/delete; those
+        wait for it, which is short since deltas are small. Queries keep
+        running on the current view.
+        """
+        with self._lock:
+            view = self.view
+            if len(view.segments) < 3:
+                return
+            start = view.segments[1].base
+            corpus = Corpus()
+            remap = {}
+            for row_id in range(start, len(view.corpus)):
+                if row_id not in view.deleted:
+                    remap[row_id] = corpus.append(**view.corpus.row(row_id)) + start
+            indexes = build_indexes(corpus)
+
+            def move(row_id: int) -> Optional[int]:
+                return row_id if row_id < start else remap.get(row_id)
+
+            deleted = {r for r in view.deleted if r < start}
+            if self._keys is not None:
+                self._keys = {k: move(r) for k, r in self._keys.items() if move(r) is not None}
+            merged = [Segment(corpus, indexes, start)] if len(corpus) else []
+            self._publish(view.segments[:1] + merged, deleted)
+
+    @staticmethod
+    def _end_of(path: str):
+        st = os.stat(path)
+        return st.st_ino, st.st_size
+
+    def tail_csv(self, path: str) -> int:
+        """Ingest whatever complete rows were appended to path since the last call.
+
+        The CSVs this service was loaded from start out fully indexed. A file
+        that was rewritten rather than appended to (new inode or shorter than
+        before) is re-read from the top; rows that did not change are skipped
+        by ingest.
+        """
+        inode, size = self._end_of(path)
+        seen_inode, offset = self._tails.get(path, (None, 0))
+        if inode != seen_inode or size < offset:
+            offset = 0
+        if size == offset:
+            return 0
+        with open(path, 'rb') as f:
+            header = f.readline()
+            fieldnames = next(csv.reader([header.decode('utf-8-sig')]))
+            f.seek(max(offset, len(header)))
+            data = f.read(size - f.tell())
+        # a scraper may be mid-write; leave a trailing partial line for next time
+        complete = data.rfind(b'\n') + 1
+        self._tails[path] = (inode, max(offset, len(header)) + complete)
+        if not complete:
+            return 0
+        rows = csv.DictReader(io.StringIO(data[:complete].decode('utf-8')), fieldnames=fieldnames)
+        return self.ingest(rows)
+
+    def follow(self, paths: List[str] = CSV_PATHS, interval: float = 30.0) -> threading.Thread:
+        """Poll paths in a daemon thread, ingesting rows the scrapers append."""
+        def loop():
+            while True:
+                time.sleep(interval)
+                for path in paths:
+                    if not os.path.exists(path):
+                        continue
+                    try:
+                        added = self.tail_csv(path)
+                    except (OSError, csv.Error, UnicodeDecodeError) as e:
+                        print(f"Could not tail {path}: {e}")
+                        continue
+                    if added:
+                        print(f"Indexed {added} new rows from {path}")
+        thread = threading.Thread(target=loop, name="csv-follow", daemon=True)
+        thread.start()
+        return thread
+
+    # -- queries -------------------------------------------------------------
+
+    def _rows_containing(self, view: SearchView, term: str) -> set:
+        rows, checked = view.substring_index.rows_containing(term)
+        if checked:
+            inc("policy_search_rows_scanned_total", checked)
+        return rows
+
+    def _score(self, view: SearchView, query_terms: List[str], phrases: List[str]) -> Dict[int, float]:
+        """BM25 per row, summed over the fields with FIELD_BOOSTS.
+
+        Terms match by substring, so a term token is scored on the best of
+        the indexed tokens containing it ("tariff" on "tariffs" too); phrase
+        tokens are scored as they are.
+        """
+        exact = {t for text in phrases or [] for t in tokenize(text)}
+        partial = {t for text in query_terms or [] for t in tokenize(text)} - exact
+        variants = [view.substring_index.tokens_containing(t) for t in partial]
+        scores: Dict[int, float] = {}
+        for field, index in (
+            ("content", view.content_index),
+            ("names", view.names_index),
+            ("policies", view.policies_index),
+        ):
+            boost = FIELD_BOOSTS[field]
+            for field_scores in [index.bm25(exact)] + [index.bm25_best(v) for v in variants]:
+                for row_id, score in field_scores.items():
+                    scores[row_id] = scores.get(row_id, 0.0) + boost * score
+        return scores
+
+    def _filter_bitmap(
+        self,
+        view: SearchView,
+        filters: Optional[Dict[str, List[str]]],
+        date_from: Optional[int] = None,
+        date_to: Optional[int] = None,
+    ) -> Optional[int]:
+        """Rows passing filters ({facet field: [values]}): any listed value within
+        a field, every field, and dated within [date_from, date_to]. None when
+        there is nothing to filter on."""
+        filters = {field: values for field, values in (filters or {}).items() if values}
+        if not filters and date_from is None and date_to is None:
+            return None
+        allowed = view.live_bitmap()
+        if date_from is not None or date_to is not None:
+            allowed &= view.dates.between(date_from, date_to)
+        for field, values in filters.items():
+            if field not in view.facets:
+                raise ValueError(f"Unknown facet '{field}'; expected one of {', '.join(FACET_FIELDS)}")
+            any_of = 0
+            for value in values:
+                any_of |= view.facets[field].match(value)
+            allowed &= any_of
+        return allowed
+
+    def _matching_rows(self, view: SearchView, query_terms, phrases, filters, date_from=None, date_to=None):
+        """Live row ids matching any term or phrase and all filters, ascending."""
+        allowed = self._filter_bitmap(view, filters, date_from, date_to)
+        if not query_terms and not phrases:
+            return view.live_range() if allowed is None else list(bitmap_rows(allowed))
+        hits = set()
+        for term in query_terms or []:
+            if term:
+                hits |= self._rows_containing(view, term)
+        for phrase in phrases or []:
+            hits |= view.content_index.rows_for_phrase(phrase)
+        if allowed is None:
+            return sorted(view.live(hits))
+        return list(bitmap_rows(rows_to_bitmap(hits) & allowed))
+
+    def facet_counts(
+        self,
+        query_terms: List[str] = None,
+        phrases: List[str] = None,
+        filters: Optional[Dict[str, List[str]]] = None,
+        fields=FACET_FIELDS,
+        limit: Optional[int] = None,
+        date_from: Optional[int] = None,
+        date_to: Optional[int] = None,
+    ) -> Dict[str, List[Dict]]:
+        """{field: [{"value", "count"}, ...]} over everything the same search matches."""
+        view = self.view
+        allowed = self._filter_bitmap(view, filters, date_from, date_to)
+        if not query_terms and not phrases:
+            rows = view.live_bitmap() if allowed is None else allowed
+        else:
+            rows = rows_to_bitmap(
+                self._matching_rows(view, query_terms, phrases, filters, date_from, date_to)
+            )
+        return {
+            field: [
+                {"value": value, "count": count}
+                for value, count in view.facets[field].count(rows, limit)
             ]
-        results = []
-        for row in self.data:
-            found = False
-            for term in query_terms:
-                term_lower = term.lower()
-                if (
-                    (row['date'] and term_lower in row['date'].lower())
-                    or any(term_lower in name.lower() for name in row['names'])
-                    or any(term_lower in policy.lower() for policy in row['policies'])
-                    or (row['source'] and term_lower in row['source'].lower())
-                    or (row['content'] and term_lower in row['content'].lower())
-                ):
-                    found = True
-                    break
-            if found:
-                results.append(self._format_result(row))
-        return results
-
-    def _format_result(self, row: Dict) -> Dict:
-        # only include 'url' for CNA or ST
+            for field in fields
+        }
+
+    def _hits(self, view: SearchView, query_terms, phrases, rank, limit, offset, filters, date_from, date_to):
+        """(row ids in the requested window, in order; BM25 scores or None if unranked)."""
+        with stage("match"):
+            matched = self._matching_rows(view, query_terms, phrases, filters, date_from, date_to)
+        inc("policy_search_hits_total", len(matched))
+
+        end = None if limit is None else offset + limit
+        if not rank or (not query_terms and not phrases):
+            return matched[offset:end], None
+        with stage("score"):
+            scores = self._score(view, query_terms, phrases)
+        def key(row_id):
+            # ties fall back to CSV order
+            return scores.get(row_id, 0.0), -row_id
+        with stage("rank"):
+            if end is None:
+                ordered = sorted(matched, key=key, reverse=True)
+            else:
+                ordered = heapq.nlargest(end, matched, key=key)
+        return ordered[offset:end], scores
+
+    @staticmethod
+    def _emit(rows, format_row) -> Iterator:
+        # formatting happens between yields, so its time is summed by hand
+        formatting = 0.0
+        try:
+            for row_id in rows:
+                start = time.perf_counter() if METRICS_ENABLED else 0.0
+                result = format_row(row_id)
+                if METRICS_ENABLED:
+                    formatting += time.perf_counter() - start
+                yield result
+        finally:
+            record_stage("format", formatting)
+
+    def iter_search(
+        self,
+        query_terms: List[str] = None,
+        phrases: List[str] = None,
+        rank: bool = False,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        filters: Optional[Dict[str, List[str]]] = None,
+        date_from: Optional[int] = None,
+        date_to: Optional[int] = None,
+    ) -> Iterator[Dict]:
+        """Lazily yield rows matching any term (substring) or phrase.
+
+        With rank=True hits are ordered by BM25 score (highest first) and each
+        result carries a 'score'; otherwise they keep CSV order. filters
+        ({"policies": [...], "names": [...], "source": [...]}) narrow the hits
+        by facet, date_from/date_to (inclusive date ordinals, as in
+        Corpus.date_ordinals) by date, and limit/offset select a window of
+        them. Undated rows never pass a date bound. Results are
+        formatted one at a time so callers can stream them without holding
+        the whole list.
+        The whole query runs against the view current when it started.
+        """
+        view = self.view
+        rows, scores = self._hits(view, query_terms, phrases, rank, limit, offset, filters, date_from, date_to)
+
+        def format_row(row_id):
+            result = self._format_result(row_id, view)
+            if scores is not None:
+                result["score"] = round(scores.get(row_id, 0.0), 4)
+            return result
+        yield from self._emit(rows, format_row)
+
+    def iter_search_json(
+        self,
+        query_terms: List[str] = None,
+        phrases: List[str] = None,
+        rank: bool = False,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        filters: Optional[Dict[str, List[str]]] = None,
+        date_from: Optional[int] = None,
+        date_to: Optional[int] = None,
+    ) -> Iterator[bytes]:
+        """iter_search, but each hit comes as its encoded JSON object.
+
+        A row is encoded once and the bytes are kept with its segment, so
+        repeated and overlapping queries only join cached fragments; the
+        score, when ranked, is spliced onto the front.
+        """
+        view = self.view
+        rows, scores = self._hits(view, query_terms, phrases, rank, limit, offset, filters, date_from, date_to)
+
+        def encode_row(row_id):
+            segment = view.corpus.segment_of(row_id)
+            fragment = segment_row_json(segment).get(
+                row_id - segment.base, lambda: self._format_result(row_id, view)
+            )
+            if scores is None:
+                return fragment
+            return with_field(fragment, "score", round(scores.get(row_id, 0.0), 4))
+        yield from self._emit(rows, encode_row)
+
+    def search(self, *args, **kwargs) -> List[Dict]:
+        return list(self.iter_search(*args, **kwargs))
+
+    def _format_result(self, row_id: int, view: Optional[SearchView] = None) -> Dict:
+        # materialize from the columns only now, at serialization time
+        corpus = (view or self.view).corpus
+        source = corpus.source(row_id)
         result = {
-            "source": row['source'],
-            "date": row['date'],
-            "content": row['content'],
-            "names": row['names'],
-            "policies": row['policies']
+            "source": source,
+            "date": corpus.date(row_id),
+            "content": corpus.content[row_id],
+            "names": corpus.names[row_id],
+            "policies": corpus.policies[row_id]
         }
-        if row['source'] and row['source'].lower() in ['straitstimes', 'cna', 'straits_times', 'straits times', 'lawgazette'] and row.get('url'):
-            result["url"] = row["url"]
+        # only include 'url' for news and Law Gazette rows
+        if source and source.lower() in URL_SOURCES:
+            url = corpus.url(row_id)
+            if url:
+                result["url"] = url
         return result
 
-# Singleton instance
-policy_search_service = PolicySearchService()
-for row in policy_search_service.data:
-    if row.get('url'):
-        print(row)
\ No newline at end of file
+def load_default_service() -> PolicySearchService:
+    """Attach to a published shared-memory corpus, else map the prebuilt
+    snapshot if it matches the CSVs on disk, else parse the CSVs."""
+    shm_name = attached_name()
+    if shm_name:
+        return PolicySearchService(snapshot=attach(shm_name))
+    if snapshot_is_fresh(SNAPSHOT_PATH, CSV_PATHS):
+        try:
+            return PolicySearchService.from_snapshot(SNAPSHOT_PATH)
+        except SnapshotError as e:
+            print(f"Ignoring snapshot {SNAPSHOT_PATH}: {e}")
+    elif os.path.exists(SNAPSHOT_PATH):
+        print(f"Snapshot {SNAPSHOT_PATH} is out of date; rebuild it with `python3 snapshot.py`.")
+    return PolicySearchService()
+
+# Singleton instance, loaded on first use so importing the classes (as benchmark.py does) reads no data
+_default_service: Optional[PolicySearchService] = None
+_default_service_lock = threading.Lock()
+
+
+def default_service() -> PolicySearchService:
+    global _default_service
+    with _default_service_lock:
+        if _default_service is None:
+            _default_service = load_default_service()
+    return _default_service
+
+
+def __getattr__(name):
+    # `from scraped_policies_search_service import policy_search_service` still works
+    if name == "policy_search_service":
+        return default_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,111 +1,198 @@
 # scraped_policies_timeline_service.py
+"""Policy timelines built from the indexed corpus.
 
-timeline = [
-    {
-        "policy": "COVID-19 Support Grant",
-        "speakers": ["Heng Swee Keat", "Josephine Teo"],
-        "summary": "Financial assistance for individuals and families affected by the COVID-19 pandemic.",
-        "changes": {
-            "creation": {
-                "date": "2020-04-01",
-                "url": "https://sprs.parl.gov.sg/hansard/example1",
-                "speakers": ["Heng Swee Keat", "Josephine Teo"],
-                "summary": "Introduction of the COVID-19 Support Grant to provide financial assistance during the pandemic.",
-            },
-            "amendments": [
-                {
-                    "date": "2020-04-15",
-                    "url": "https://sprs.parl.gov.sg/hansard/example12",
-                    "speakers": ["Heng Swee Keat"],
-                    "summary": "Expanded eligibility to include part-time workers.",
-                },
-                {
-                    "date": "2020-05-01",
-                    "url": "https://sprs.parl.gov.sg/hansard/example13",
-                    "speakers": ["Josephine Teo"],
-                    "summary": "Increased grant amount for families with children under 12.",
-                },
-                {
-                    "date": "2020-06-01",
-                    "url": "https://sprs.parl.gov.sg/hansard/example14",
-                    "speakers": ["Heng Swee Keat", "Josephine Teo"],
-                    "summary": "Extended application deadline due to high demand.",
-                }
-            ],
-            "dissolution": None
-        }
-    },
-    {
-        "policy": "Jobs Support Scheme",
-        "speakers": ["Heng Swee Keat"],
-        "summary": "Salary subsidies to help businesses retain workers during economic downturn.",
-        "changes": {
-            "creation": {
-                "date": "2020-04-06",
-                "url": "https://sprs.parl.gov.sg/hansard/example2",
-                "speakers": ["Heng Swee Keat"],
-                "summary": "Launched Jobs Support Scheme to subsidise employee salaries.",
+A policy's events are the distinct dates on which rows tagged with it were
+published. The earliest is its creation, and later dates whose text around
+the mention talks about changing it are amendments. The last date counts as
+its dissolution only if that text talks about ending it. Rows come from the
+policies facet bitmap, so building a timeline never scans the corpus, and
+each timeline is cached until the search service's generation moves on
+(i.e. until records are ingested or deleted).
+"""
+import re
+import threading
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from datetime import date
+from typing import Dict, List, Optional
+
+from facets import bitmap_rows
+from scraped_policies_search_service import PolicySearchService, default_service
+
+AMENDMENT_CUES = re.compile(
+    r"\b(amend\w*|extend\w*|extension|expand\w*|enhanc\w*|increas\w*|revis\w*|"
+    r"updat\w*|tighten\w*|relax\w*|top[- ]up|second tranche|additional)\b",
+    re.IGNORECASE,
+)
+DISSOLUTION_CUES = re.compile(
+    r"\b(repeal\w*|abolish\w*|dissol\w*|lapse[sd]?|ceas\w*|wound down|wind down|"
+    r"phased? out|lift\w*|ended|expir\w*|discontinu\w*)\b",
+    re.IGNORECASE,
+)
+# text either side of a policy mention searched for cues and used as the summary
+CONTEXT_CHARS = 300
+# mentions per row looked at; long Hansard sittings repeat the same keyword a lot
+MAX_MENTIONS_PER_ROW = 5
+MAX_SPEAKERS = 5
+DEFAULT_TIMELINE_LIMIT = 20
+
+HANSARD_URL = "https://sprs.parl.gov.sg/search/#/fullreport?sittingdate={date}"
+
+
+def _mention_re(policy: str):
+    return re.compile(rf"(?<!\w){re.escape(policy)}(?!\w)", re.IGNORECASE)
+
+
+def _sentence_around(text: str, start: int, end: int) -> str:
+    """The sentence holding text[start:end], clipped to CONTEXT_CHARS either side."""
+    window_start = max(0, start - CONTEXT_CHARS)
+    lo = text.rfind(". ", window_start, start)
+    lo = lo + 2 if lo != -1 else window_start
+    hi = text.find(". ", end, end + CONTEXT_CHARS)
+    hi = hi + 1 if hi != -1 else min(len(text), end + CONTEXT_CHARS)
+    return text[lo:hi].strip()
+
+
+class PolicyTimelineService:
+    def __init__(self, search_service: PolicySearchService):
+        self.search_service = search_service
+        self._lock = threading.Lock()
+        self._generation = None
+        self._cache: Dict[str, Dict] = {}
+
+    def _cached(self, policy: str) -> Dict:
+        generation = self.search_service.generation
+        with self._lock:
+            if generation != self._generation:
+                self._cache = {}
+                self._generation = generation
+            entry = self._cache.get(policy.casefold())
+        if entry is None:
+            entry = self._build(policy)
+            with self._lock:
+                if generation == self._generation:
+                    self._cache[policy.casefold()] = entry
+        return entry
+
+    def _event(self, view, policy_re, rows: List[int], ordinal: int) -> Dict:
+        corpus = view.corpus
+        speakers = Counter()
+        url = None
+        summary = ""
+        amendment = dissolution = False
+        for row_id in rows:
+            speakers.update(corpus.names[row_id])
+            url = url or corpus.url(row_id)
+            content = corpus.content[row_id]
+            for i, match in enumerate(policy_re.finditer(content)):
+                if i == MAX_MENTIONS_PER_ROW:
+                    break
+                context = _sentence_around(content, match.start(), match.end())
+                summary = summary or context
+                amendment = amendment or bool(AMENDMENT_CUES.search(context))
+                dissolution = dissolution or bool(DISSOLUTION_CUES.search(context))
+        if url is None and (corpus.source(rows[0]) or "").lower() == "hansard":
+            url = HANSARD_URL.format(date=corpus.date(rows[0]))
+        return {
+            "ordinal": ordinal,
+            "event": {
+                "date": date.fromordinal(ordinal).isoformat(),
+                "url": url,
+                "speakers": [name for name, _ in speakers.most_common(MAX_SPEAKERS)],
+                "summary": summary,
             },
-            "amendments": [
-                {
-                    "date": "2020-04-21",
-                    "url": "https://sprs.parl.gov.sg/hansard/example11",
-                    "speakers": ["Heng Swee Keat"],
-                    "summary": "Scheme extended to include shareholder-directors under certain conditions.",
-                }
-            ],
-            "dissolution": None
+            "amendment": amendment,
+            "dissolution": dissolution,
         }
-    },
-    {
-        "policy": "Circuit Breaker Measures",
-        "speakers": ["Gan Kim Yong", "Lawrence Wong"],
-        "summary": "Temporary restrictions on businesses, schools, and gathering to control COVID-19 spread.",
-        "changes": {
-            "creation": {
-                "date": "2020-04-07",
-                "url": "https://sprs.parl.gov.sg/hansard/example3",
-                "speakers": ["Gan Kim Yong", "Lawrence Wong"],
-                "summary": "Announcement of comprehensive COVID-19 restrictions.",
-            },
-            "amendments": [],
-            "dissolution": {
-                "date": "2020-06-01",
-                "url": "https://sprs.parl.gov.sg/hansard/example3",
-                "speakers": ["Lawrence Wong"],
-                "summary": "Gradual lifting of Circuit Breaker restrictions.",
-            }
+
+    def _build(self, policy: str) -> Dict:
+        """Every dated event for policy, oldest first, classified once."""
+        view = self.search_service.view
+        rows = view.facets["policies"].match(policy) & view.live_bitmap()
+        by_date: Dict[int, List[int]] = {}
+        for row_id in bitmap_rows(rows):
+            ordinal = view.corpus.date_ordinals[row_id]
+            if ordinal:
+                by_date.setdefault(ordinal, []).append(row_id)
+        policy_re = _mention_re(policy)
+        events = [self._event(view, policy_re, by_date[o], o) for o in sorted(by_date)]
+        speakers = view.facets["names"].count(rows, MAX_SPEAKERS)
+        return {
+            "policy": policy,
+            "speakers": [name for name, _ in speakers],
+            "mentions": rows.bit_count(),
+            "events": events,
+            "ordinals": [e["ordinal"] for e in events],
         }
-    },
-    {
-        "policy": "COVID-19 Recovery Grant",
-        "speakers": ["Minister for Social and Family Development"],
-        "summary": "Financial assistance for lower- to middle-income employees and self-employed persons affected by COVID-19.",
-        "changes": {
-            "creation": {
-                "date": "2021-01-18",
-                "url": "https://www.msf.gov.sg/media-room/article/COVID-19-Recovery-Grant-to-Provide-Further-Support",
-                "speakers": ["Minister for Social and Family Development"],
-                "summary": "Introduction of the COVID-19 Recovery Grant to support individuals facing job loss, no-pay leave, or significant income loss due to COVID-19.",
+
+    def timeline(self, policy: str, date_from: Optional[int] = None, date_to: Optional[int] = None) -> Dict:
+        """One policy's timeline, limited to events within [date_from, date_to] (ordinals)."""
+        entry = self._cached(policy)
+        ordinals = entry["ordinals"]
+        lo = 0 if date_from is None else bisect_left(ordinals, date_from)
+        hi = len(ordinals) if date_to is None else bisect_right(ordinals, date_to)
+        events = entry["events"]
+        creation = events[0] if events else None
+        dissolution = events[-1] if len(events) > 1 and events[-1]["dissolution"] else None
+        in_window = events[lo:hi]
+        return {
+            "policy": entry["policy"],
+            "speakers": entry["speakers"],
+            "mentions": entry["mentions"],
+            "summary": creation["event"]["summary"] if creation else "",
+            "changes": {
+                "creation": creation["event"] if creation and lo == 0 and hi > 0 else None,
+                "amendments": [
+                    e["event"] for e in in_window
+                    if e is not creation and e is not dissolution and e["amendment"]
+                ],
+                "dissolution": dissolution["event"] if dissolution and hi == len(events) else None,
             },
-            "amendments": [
-                {
-                    "date": "2021-04-19",
-                    "url": "https://www.msf.gov.sg/media-room/article/COVID-19-Recovery-Grant-to-Provide-Further-Support",
-                    "speakers": ["Minister for Social and Family Development"],
-                    "summary": "Introduction of a second tranche of CRG support for eligible recipients.",
-                },
-                {
-                    "date": "2022-12-16",
-                    "url": "https://www.msf.gov.sg/media-room/article/COVID-19-Recovery-Grant-Extended-to-31-December-2023",
-                    "speakers": ["Minister for Social and Family Development"],
-                    "summary": "Extension of the CRG application period until 31 December 2023 to continue providing support for affected workers.",
-                }
-            ],
-            "dissolution": None
         }
-    }
-]
 
-def get_policy_timeline():
-    return timeline
+    def timelines(
+        self,
+        policy: Optional[str] = None,
+        date_from: Optional[int] = None,
+        date_to: Optional[int] = None,
+        limit: Optional[int] = DEFAULT_TIMELINE_LIMIT,
+    ) -> List[Dict]:
+        """Timelines for one policy, or the most mentioned ones, skipping those
+        with nothing inside the window."""
+        if policy:
+            policies = [policy]
+        else:
+            policies = sorted(
+                self.search_service.policy_counts().items(), key=lambda c: (-c[1], c[0])
+            )
+            policies = [p for p, _ in policies]
+        results = []
+        for name in policies:
+            entry = self.timeline(name, date_from, date_to)
+            changes = entry["changes"]
+            if changes["creation"] or changes["amendments"] or changes["dissolution"]:
+                results.append(entry)
+                if limit is not None and len(results) >= limit:
+                    break
+        return results
+
+
+_default_timeline_service: Optional[PolicyTimelineService] = None
+
+
+def default_timeline_service() -> PolicyTimelineService:
+    """Timelines over the default search service, which is loaded on first use."""
+    global _default_timeline_service
+    if _default_timeline_service is None:
+        _default_timeline_service = PolicyTimelineService(default_service())
+    return _default_timeline_service
+
+
+def __getattr__(name):
+    if name == "policy_timeline_service":
+        return default_timeline_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def get_policy_timeline(policy=None, date_from=None, date_to=None, limit=DEFAULT_TIMELINE_LIMIT):
+    return default_timeline_service().timelines(policy, date_from, date_to, limit)
@@ -0,0 +1,387 @@
+import math
+import re
+from array import array
+from collections import Counter
+from itertools import accumulate
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from corpus import TextColumn
+
+TOKEN_RE = re.compile(r"\w+")
+BM25_K1 = 1.2
+BM25_B = 0.75
+# joins a row's searchable fields in SubstringIndex.text; never part of a query term
+FIELD_SEP = "\x00"
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens, in order, for positional indexing."""
+    if not text:
+        return []
+    return TOKEN_RE.findall(text.lower())
+
+
+class FlatPostings:
+    """Read-only term -> rows view over flat arrays.
+
+    term_offsets[t]:term_offsets[t + 1] is term t's range in rows, with
+    tfs[j] how often it occurs in rows[j]. Phrases are matched against
+    tokens, every row's text as a run of term ids (row r's run starts at
+    token_offsets[r]). The arrays can be memoryviews into a mapped file.
+    """
+
+    def __init__(self, terms: List[str], term_offsets, rows, tfs, tokens, token_offsets):
+        self.terms = terms
+        self.term_ids = {term: i for i, term in enumerate(terms)}
+        self.term_offsets = term_offsets
+        self.rows = rows
+        self.tfs = tfs
+        self.tokens = tokens
+        self.token_offsets = token_offsets
+
+    def span(self, term: str) -> Tuple[int, int]:
+        """term's [start, end) range in rows; empty for an unknown term."""
+        t = self.term_ids.get(term)
+        if t is None:
+            return 0, 0
+        return self.term_offsets[t], self.term_offsets[t + 1]
+
+    def doc_freq(self, term: str) -> int:
+        start, end = self.span(term)
+        return end - start
+
+    def row_tokens(self, row_id: int) -> bytes:
+        """Row's term ids as raw bytes, one tokens.itemsize each."""
+        return self.tokens[self.token_offsets[row_id]:self.token_offsets[row_id + 1]].tobytes()
+
+    def __contains__(self, term: str) -> bool:
+        return term in self.term_ids
+
+    def __iter__(self):
+        return iter(self.term_ids)
+
+    def __len__(self) -> int:
+        return len(self.term_ids)
+
+
+class FlatRowSets:
+    """Read-only key -> row ids view over flat arrays (the form of SubstringIndex.tokens)."""
+
+    def __init__(self, keys: List[str], offsets, rows):
+        self.keys = keys
+        self.key_ids = {key: i for i, key in enumerate(keys)}
+        self.offsets = offsets
+        self.rows = rows
+
+    def rows_of(self, key: str):
+        """key's row ids, ascending, as a slice of the flat array (empty if unknown)."""
+        i = self.key_ids.get(key)
+        if i is None:
+            return ()
+        return self.rows[self.offsets[i]:self.offsets[i + 1]]
+
+    def count(self, key: str) -> int:
+        i = self.key_ids.get(key)
+        return 0 if i is None else self.offsets[i + 1] - self.offsets[i]
+
+    def get(self, key: str, default=None):
+        i = self.key_ids.get(key)
+        return default if i is None else set(self.rows_of(key))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+
+class InvertedIndex:
+    """Term -> rows (with term frequencies) and each row's token run, for one text field.
+
+    add() every row, in row id order from 0, then freeze(). While building,
+    each term's rows and frequencies go into two small arrays of its own;
+    freeze() packs them into the flat layout FlatPostings reads, which is
+    also what a snapshot stores. Queries on an index that was never frozen
+    freeze it.
+    """
+
+    def __init__(self):
+        # until freeze(): term -> (row ids, term frequencies), and term -> id in order of first use
+        self._pending: Dict[str, Tuple[array, array]] = {}
+        self._ids: Dict[str, int] = {}
+        self._tokens = array('I')
+        self._postings: Optional[FlatPostings] = None
+        self.doc_lengths = array('I')
+        self.total_length = 0
+
+    def add(self, row_id: int, text: str):
+        tokens = tokenize(text)
+        self.doc_lengths.append(len(tokens))
+        self.total_length += len(tokens)
+        pending, ids = self._pending, self._ids
+        for token, tf in Counter(tokens).items():
+            entry = pending.get(token)
+            if entry is None:
+                ids[token] = len(ids)
+                entry = pending[token] = (array('I'), array('I'))
+            entry[0].append(row_id)
+            entry[1].append(tf)
+        self._tokens.extend(map(ids.__getitem__, tokens))
+
+    def freeze(self) -> "InvertedIndex":
+        terms = sorted(self._pending)
+        term_offsets, rows, tfs = array('Q', [0]), array('I'), array('I')
+        for term in terms:
+            term_rows, term_tfs = self._pending[term]
+            rows.extend(term_rows)
+            tfs.extend(term_tfs)
+            term_offsets.append(len(rows))
+        # ids were handed out in order of first use; renumber them to match terms
+        renumber = array('I', [0]) * len(terms)
+        for i, term in enumerate(terms):
+            renumber[self._ids[term]] = i
+        tokens = array('I', map(renumber.__getitem__, self._tokens))
+        self._pending, self._ids, self._tokens = {}, {}, array('I')
+        token_offsets = array('Q', accumulate(self.doc_lengths, initial=0))
+        self._postings = FlatPostings(terms, term_offsets, rows, tfs, tokens, token_offsets)
+        return self
+
+    @property
+    def postings(self) -> FlatPostings:
+        if self._postings is None:
+            self.freeze()
+        return self._postings
+
+    def to_flat(self) -> Tuple[List[str], Dict[str, array]]:
+        """Terms plus the flat arrays FlatPostings reads."""
+        postings = self.postings
+        return postings.terms, {
+            "term_offsets": postings.term_offsets,
+            "rows": postings.rows,
+            "tfs": postings.tfs,
+            "tokens": postings.tokens,
+            "token_offsets": postings.token_offsets,
+            "doc_lengths": self.doc_lengths,
+        }
+
+    @classmethod
+    def from_flat(cls, terms: List[str], arrays: Dict, total_length: int) -> "InvertedIndex":
+        index = cls()
+        index._postings = FlatPostings(
+            terms, arrays["term_offsets"], arrays["rows"], arrays["tfs"], arrays["tokens"], arrays["token_offsets"]
+        )
+        index.doc_lengths = arrays["doc_lengths"]
+        index.total_length = total_length
+        return index
+
+    def rows_for_term(self, term: str) -> Set[int]:
+        postings = self.postings
+        start, end = postings.span(term.lower())
+        return set(postings.rows[start:end])
+
+    def doc_freq(self, term: str) -> int:
+        return self.postings.doc_freq(term)
+
+    def bm25(
+        self,
+        tokens: Iterable[str],
+        k1: float = BM25_K1,
+        b: float = BM25_B,
+        n: int = None,
+        avgdl: float = None,
+        df: Dict[str, int] = None,
+    ) -> Dict[int, float]:
+        """BM25 score per row for the given query tokens; rows without a hit are absent.
+
+        n, avgdl and df default to this index's own statistics; a segmented
+        index passes corpus-wide values so scores are comparable across segments.
+        """
+        if n is None:
+            n = len(self.doc_lengths)
+            avgdl = self.total_length / n if n else 0.0
+        if not n:
+            return {}
+        avgdl = avgdl or 1.0
+        postings = self.postings
+        rows, tfs, doc_lengths = postings.rows, postings.tfs, self.doc_lengths
+        scores: Dict[int, float] = {}
+        for token in set(tokens):
+            start, end = postings.span(token)
+            if start == end:
+                continue
+            token_df = df[token] if df is not None else end - start
+            idf = math.log(1 + (n - token_df + 0.5) / (token_df + 0.5))
+            for j in range(start, end):
+                row_id = rows[j]
+                tf = tfs[j]
+                norm = k1 * (1 - b + b * doc_lengths[row_id] / avgdl)
+                scores[row_id] = scores.get(row_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+        return scores
+
+    def bm25_best(self, variants: Iterable[str], **stats) -> Dict[int, float]:
+        """Per row, the highest BM25 score of any one of variants (the indexed
+        tokens a query term is a substring of); takes bm25's statistics."""
+        scores: Dict[int, float] = {}
+        for token in set(variants):
+            for row_id, score in self.bm25((token,), **stats).items():
+                if score > scores.get(row_id, 0.0):
+                    scores[row_id] = score
+        return scores
+
+    def rows_for_phrase(self, phrase: str) -> Set[int]:
+        """Rows whose tokens contain the phrase tokens consecutively."""
+        tokens = tokenize(phrase)
+        if not tokens:
+            return set()
+        if len(tokens) == 1:
+            return self.rows_for_term(tokens[0])
+        postings = self.postings
+        if any(t not in postings for t in tokens):
+            return set()
+        candidates = set.intersection(*(self.rows_for_term(t) for t in set(tokens)))
+        # the phrase as it would appear in a row's token run; a hit must start on a whole id
+        needle = array('I', (postings.term_ids[t] for t in tokens)).tobytes()
+        width = postings.tokens.itemsize
+        matches = set()
+        for row_id in candidates:
+            haystack = postings.row_tokens(row_id)
+            i = haystack.find(needle)
+            while i != -1 and i % width:
+                i = haystack.find(needle, i + 1)
+            if i != -1:
+                matches.add(row_id)
+        return matches
+
+
+class SubstringIndex:
+    """Case-insensitive substring search over each row's searchable fields.
+
+    A term made only of word characters can only occur inside a token, so
+    its rows are the rows of every indexed token containing it: a scan of
+    the vocabulary, not of the text, and exact. Any other term ("covid-19",
+    "circuit breaker") is narrowed the same way by each of its tokens, then
+    checked against text, one lowercased copy of the rows' fields.
+
+    Built like InvertedIndex: add() every row in order, then freeze().
+    Tokens already in a field's InvertedIndex need not be indexed again:
+    build_indexes passes only the date and source tokens to add() and hands
+    the field indexes to freeze(), which merges their rows in per term.
+    """
+
+    def __init__(self):
+        self._pending: Dict[str, array] = {}
+        self._tokens: Optional[FlatRowSets] = None
+        self._vocabulary: Optional[str] = None
+        self.text = TextColumn()
+
+    def add(self, row_id: int, values: Iterable[str], tokens: Optional[Iterable[str]] = None):
+        """Keep the row's fields (lowercased) and index tokens, by default every token in them."""
+        lowered = FIELD_SEP.join(value or '' for value in values).lower()
+        self.text.append(lowered)
+        pending = self._pending
+        for token in set(TOKEN_RE.findall(lowered) if tokens is None else tokens):
+            rows = pending.get(token)
+            if rows is None:
+                rows = pending[token] = array('I')
+            rows.append(row_id)
+
+    def freeze(self, *fields: InvertedIndex) -> "SubstringIndex":
+        postings = [index.postings for index in fields]
+        keys = set(self._pending)
+        for field in postings:
+            keys.update(field.terms)
+        keys = sorted(keys)
+        offsets, rows = array('Q', [0]), array('I')
+        for key in keys:
+            parts = [self._pending[key]] if key in self._pending else []
+            for field in postings:
+                start, end = field.span(key)
+                if start < end:
+                    parts.append(field.rows[start:end])
+            rows.extend(parts[0] if len(parts) == 1 else sorted(set().union(*parts)))
+            offsets.append(len(rows))
+        self._pending = {}
+        self._tokens = FlatRowSets(keys, offsets, rows)
+        return self
+
+    @property
+    def tokens(self) -> FlatRowSets:
+        if self._tokens is None:
+            self.freeze()
+        return self._tokens
+
+    def to_flat(self) -> Tuple[List[str], Dict[str, array]]:
+        tokens = self.tokens
+        return tokens.keys, {
+            "offsets": tokens.offsets,
+            "rows": tokens.rows,
+            "text_buffer": self.text.buffer,
+            "text_offsets": self.text.offsets,
+        }
+
+    @classmethod
+    def from_flat(cls, keys: List[str], arrays: Dict) -> "SubstringIndex":
+        index = cls()
+        index._tokens = FlatRowSets(keys, arrays["offsets"], arrays["rows"])
+        index.text.buffer = arrays["text_buffer"]
+        index.text.offsets = arrays["text_offsets"]
+        return index
+
+    def tokens_containing(self, part: str) -> List[str]:
+        """Indexed tokens that have part (lowercase, no separators) as a substring."""
+        if self._vocabulary is None:
+            # one line per token, so str.find walks the whole vocabulary at C speed
+            self._vocabulary = "\n" + "\n".join(self.tokens.keys) + "\n"
+        vocabulary = self._vocabulary
+        found = []
+        i = vocabulary.find(part)
+        while i != -1:
+            start = vocabulary.rfind("\n", 0, i) + 1
+            end = vocabulary.find("\n", i)
+            found.append(vocabulary[start:end])
+            i = vocabulary.find(part, end)
+        return found
+
+    def _rows_with_part(self, part: str) -> Set[int]:
+        tokens = self.tokens
+        rows: Set[int] = set()
+        # the most widespread tokens first, so a term in every row stops early
+        for token in sorted(self.tokens_containing(part), key=tokens.count, reverse=True):
+            rows.update(tokens.rows_of(token))
+            if len(rows) == len(self.text):
+                break
+        return rows
+
+    def rows_containing(self, term: str) -> Tuple[Set[int], int]:
+        """(rows whose fields contain term, ignoring case; how many rows' text had to be checked)."""
+        term = term.lower()
+        if TOKEN_RE.fullmatch(term):
+            return self._rows_with_part(term), 0
+        parts = TOKEN_RE.findall(term)
+        if parts:
+            candidates = None
+            for part in sorted(set(parts), key=len, reverse=True):
+                rows = self._rows_with_part(part)
+                candidates = rows if candidates is None else candidates & rows
+                if not candidates:
+                    return set(), 0
+        else:
+            candidates = range(len(self.text))
+        text = self.text
+        return {row_id for row_id in candidates if term in text[row_id]}, len(candidates)
+
+
+def build_indexes(corpus) -> Dict[str, object]:
+    """Every index PolicySearchService queries, built in one pass over a Corpus."""
+    indexes = {
+        "content": InvertedIndex(),
+        "names": InvertedIndex(),
+        "policies": InvertedIndex(),
+        "substring": SubstringIndex(),
+    }
+    for row_id in range(len(corpus)):
+        indexes["content"].add(row_id, corpus.content[row_id])
+        indexes["names"].add(row_id, ' '.join(corpus.names[row_id]))
+        indexes["policies"].add(row_id, ' '.join(corpus.policies[row_id]))
+        date, source = corpus.date(row_id) or '', corpus.source(row_id) or ''
+        indexes["substring"].add(row_id, corpus.searchable_fields(row_id), tokenize(f"{date} {source}"))
+    fields = [indexes[field].freeze() for field in ("content", "names", "policies")]
+    indexes["substring"].freeze(*fields)
+    return indexes
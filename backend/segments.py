@@ -0,0 +1,224 @@
+"""Segmented corpus so new records can be indexed without rebuilding everything.
+
+The corpus is a list of immutable segments, each holding a Corpus and its
+own indexes with local row ids. A segment's global row ids start at its
+base. The first segment is the bulk load (CSV parse or mapped snapshot).
+Ingested records land in small delta segments, which are merged
+periodically. Deletes and updates only add row ids to a tombstone set.
+
+Readers take one SearchView and use it for the whole query. Writers build
+a new view and swap it in with one assignment, so a query never sees a
+half-applied ingest.
+"""
+from bisect import bisect_right
+from collections import Counter
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from facets import FACET_FIELDS, DateIndex, FacetIndex, count_values, rows_to_bitmap
+from serialization import RowJSONCache
+
+
+class Segment(NamedTuple):
+    corpus: object
+    indexes: Dict
+    base: int
+
+
+class _ColumnView:
+    """corpus.<attr>[global row id] across segments."""
+
+    def __init__(self, owner: "SegmentedCorpus", attr: str):
+        self.owner = owner
+        self.attr = attr
+
+    def __getitem__(self, row_id: int):
+        corpus, local = self.owner.locate(row_id)
+        return getattr(corpus, self.attr)[local]
+
+
+class SegmentedCorpus:
+    """Read-only Corpus facade over a list of segments, addressed by global row id."""
+
+    def __init__(self, segments: List[Segment]):
+        self.segments = segments
+        self.bases = [s.base for s in segments]
+        self.content = _ColumnView(self, "content")
+        self.names = _ColumnView(self, "names")
+        self.policies = _ColumnView(self, "policies")
+        self.date_ordinals = _ColumnView(self, "date_ordinals")
+        last = segments[-1] if segments else None
+        self._len = last.base + len(last.corpus) if last else 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def segment_of(self, row_id: int) -> Segment:
+        return self.segments[bisect_right(self.bases, row_id) - 1]
+
+    def locate(self, row_id: int):
+        segment = self.segment_of(row_id)
+        return segment.corpus, row_id - segment.base
+
+    def source(self, row_id: int):
+        corpus, local = self.locate(row_id)
+        return corpus.source(local)
+
+    def date(self, row_id: int):
+        corpus, local = self.locate(row_id)
+        return corpus.date(local)
+
+    def url(self, row_id: int):
+        corpus, local = self.locate(row_id)
+        return corpus.url(local)
+
+    def searchable_fields(self, row_id: int) -> List[str]:
+        corpus, local = self.locate(row_id)
+        return corpus.searchable_fields(local)
+
+    def row(self, row_id: int) -> Dict:
+        corpus, local = self.locate(row_id)
+        return corpus.row(local)
+
+    def key(self, row_id: int) -> str:
+        corpus, local = self.locate(row_id)
+        return corpus.key(local)
+
+
+class SegmentedIndex:
+    """One InvertedIndex field across segments, with corpus-wide BM25 statistics.
+
+    Deleted rows keep counting toward N, avgdl and df until their segment is
+    merged, so scores can drift slightly in between.
+    """
+
+    def __init__(self, segments: List[Segment], field: str):
+        self.parts = [(s.indexes[field], s.base) for s in segments]
+
+    def rows_for_phrase(self, phrase: str) -> Set[int]:
+        rows = set()
+        for index, base in self.parts:
+            rows.update(r + base for r in index.rows_for_phrase(phrase))
+        return rows
+
+    def _scores(self, method: str, tokens: Iterable[str]) -> Dict[int, float]:
+        tokens = set(tokens)
+        n = sum(len(index.doc_lengths) for index, _ in self.parts)
+        if not n:
+            return {}
+        avgdl = sum(index.total_length for index, _ in self.parts) / n
+        df = {t: sum(index.doc_freq(t) for index, _ in self.parts) for t in tokens}
+        scores = {}
+        for index, base in self.parts:
+            for row_id, score in getattr(index, method)(tokens, n=n, avgdl=avgdl, df=df).items():
+                scores[row_id + base] = score
+        return scores
+
+    def bm25(self, tokens: Iterable[str]) -> Dict[int, float]:
+        return self._scores("bm25", tokens)
+
+    def bm25_best(self, variants: Iterable[str]) -> Dict[int, float]:
+        return self._scores("bm25_best", variants)
+
+
+class SegmentedSubstringIndex:
+    def __init__(self, segments: List[Segment]):
+        self.parts = [(s.indexes["substring"], s.base) for s in segments]
+
+    def tokens_containing(self, part: str) -> Set[str]:
+        tokens = set()
+        for index, _ in self.parts:
+            tokens.update(index.tokens_containing(part))
+        return tokens
+
+    def rows_containing(self, term: str) -> Tuple[Set[int], int]:
+        rows, checked = set(), 0
+        for index, base in self.parts:
+            part, part_checked = index.rows_containing(term)
+            rows.update(part if not base else (r + base for r in part))
+            checked += part_checked
+        return rows, checked
+
+
+def segment_facets(segment: Segment, field: str) -> FacetIndex:
+    """The segment's FacetIndex for field, built the first time it is asked for."""
+    facets = segment.indexes.setdefault("facets", {})
+    if field not in facets:
+        facets[field] = FacetIndex.from_corpus(segment.corpus, field)
+    return facets[field]
+
+
+def segment_dates(segment: Segment) -> DateIndex:
+    if "dates" not in segment.indexes:
+        segment.indexes["dates"] = DateIndex.from_corpus(segment.corpus)
+    return segment.indexes["dates"]
+
+
+def segment_row_json(segment: Segment) -> RowJSONCache:
+    if "row_json" not in segment.indexes:
+        segment.indexes["row_json"] = RowJSONCache()
+    return segment.indexes["row_json"]
+
+
+class SegmentedFacets:
+    """One facet field across segments, taking and returning global row ids."""
+
+    def __init__(self, segments: List[Segment], field: str):
+        self.segments = segments
+        self.field = field
+
+    def match(self, value: str) -> int:
+        bitmap = 0
+        for segment in self.segments:
+            bitmap |= segment_facets(segment, self.field).match(value) << segment.base
+        return bitmap
+
+    def count(self, rows: int, limit: Optional[int] = None) -> List[Tuple[str, int]]:
+        """(value, rows carrying it) within rows (a bitmap), most common first, zero counts dropped."""
+        counts = Counter()
+        for segment in self.segments:
+            local = rows >> segment.base & ((1 << len(segment.corpus)) - 1)
+            if local:
+                segment_facets(segment, self.field).count(local, counts)
+        return count_values(counts, limit)
+
+
+class SegmentedDates:
+    def __init__(self, segments: List[Segment]):
+        self.segments = segments
+
+    def between(self, start: Optional[int] = None, end: Optional[int] = None) -> int:
+        bitmap = 0
+        for segment in self.segments:
+            bitmap |= segment_dates(segment).between(start, end) << segment.base
+        return bitmap
+
+
+class SearchView:
+    """Everything one query needs, frozen at the moment it was taken."""
+
+    def __init__(self, segments: List[Segment], deleted: FrozenSet[int] = frozenset()):
+        self.segments = segments
+        self.deleted = deleted
+        self.corpus = SegmentedCorpus(segments)
+        self.content_index = SegmentedIndex(segments, "content")
+        self.names_index = SegmentedIndex(segments, "names")
+        self.policies_index = SegmentedIndex(segments, "policies")
+        self.substring_index = SegmentedSubstringIndex(segments)
+        self.facets = {field: SegmentedFacets(segments, field) for field in FACET_FIELDS}
+        self.dates = SegmentedDates(segments)
+        self._live_bitmap: Optional[int] = None
+
+    def live(self, row_ids: Iterable[int]) -> Set[int]:
+        rows = set(row_ids)
+        return rows - self.deleted if self.deleted else rows
+
+    def live_range(self) -> Iterable[int]:
+        if not self.deleted:
+            return range(len(self.corpus))
+        return [r for r in range(len(self.corpus)) if r not in self.deleted]
+
+    def live_bitmap(self) -> int:
+        """Bitmap of every row not deleted."""
+        if self._live_bitmap is None:
+            self._live_bitmap = ((1 << len(self.corpus)) - 1) & ~rows_to_bitmap(self.deleted)
+        return self._live_bitmap
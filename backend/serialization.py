@@ -0,0 +1,105 @@
+"""JSON encoding for the listing endpoints.
+
+Search hits are encoded once per row and the bytes are kept in an LRU,
+so a broad query builds its response by joining cached fragments instead
+of building and encoding a dict per hit every time. The LRU holds the
+rows of every segment of a process within one ROW_JSON_CACHE_BYTES
+budget, evicting the least recently served rows past it, so adding
+segments does not add memory and a corpus bigger than the budget keeps
+its most requested rows encoded. Every process (each gunicorn worker,
+say) has its own, so a server holds up to workers x ROW_JSON_CACHE_BYTES.
+orjson is used when it is installed (pip install orjson); otherwise the
+stdlib encoder does the same job more slowly.
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+from itertools import count
+from typing import Callable, Dict, Iterable, Optional, Tuple, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# for all segments of one process; past it the least recently served rows are dropped
+ROW_JSON_CACHE_BYTES = int(os.getenv("ROW_JSON_CACHE_BYTES", 8 * 1024 * 1024))
+
+Encodable = Union[bytes, Dict]
+
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def encode(item: Encodable) -> bytes:
+    """item as JSON; bytes are taken to be JSON already."""
+    return item if isinstance(item, bytes) else dumps(item)
+
+
+def with_field(fragment: bytes, key: str, value) -> bytes:
+    """Prepend one field to an encoded JSON object."""
+    return b"{" + dumps(key) + b":" + dumps(value) + b"," + fragment[1:]
+
+
+def json_object(fields: Dict, key: str, items: Iterable[Encodable]) -> bytes:
+    """{**fields, key: [items...]} with items spliced in as encoded."""
+    parts = [dumps(k) + b":" + dumps(v) for k, v in fields.items()]
+    parts.append(dumps(key) + b":[" + b",".join(encode(item) for item in items) + b"]")
+    return b"{" + b",".join(parts) + b"}"
+
+
+class RowJSONLRU:
+    """(segment, row id) -> encoded row, least recently used evicted past max_bytes."""
+
+    def __init__(self, max_bytes: int = ROW_JSON_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._rows: "OrderedDict[Tuple[int, int], bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[int, int]) -> Optional[bytes]:
+        with self._lock:
+            fragment = self._rows.get(key)
+            if fragment is not None:
+                self._rows.move_to_end(key)
+            return fragment
+
+    def put(self, key: Tuple[int, int], fragment: bytes):
+        if len(fragment) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._rows:
+                return
+            self._rows[key] = fragment
+            self.size += len(fragment)
+            while self.size > self.max_bytes:
+                _, evicted = self._rows.popitem(last=False)
+                self.size -= len(evicted)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+
+row_json_lru = RowJSONLRU()
+# a segment's rows are keyed by a number never reused, so a retired segment's rows just age out
+_segment_numbers = count()
+
+
+class RowJSONCache:
+    """row id -> encoded result for one corpus segment, kept in a shared RowJSONLRU."""
+
+    def __init__(self, lru: RowJSONLRU = row_json_lru):
+        self.lru = lru
+        self.segment = next(_segment_numbers)
+
+    def get(self, row_id: int, build: Callable[[], Dict]) -> bytes:
+        key = (self.segment, row_id)
+        fragment = self.lru.get(key)
+        if fragment is None:
+            fragment = dumps(build())
+            self.lru.put(key, fragment)
+        return fragment
@@ -0,0 +1,112 @@
+"""Publish the search snapshot once into shared memory and attach workers to it.
+
+One loader process copies the snapshot into a multiprocessing.shared_memory
+segment; every request worker then attaches by name and reads the corpus
+and indexes as memoryviews over that segment, so the data exists once per
+host instead of once per worker. Run the loader standalone:
+
+    cd backend && python3 shared_corpus.py        # prints the segment name
+    POLICY_SHM_NAME=<name> gunicorn app:app -w 8
+
+or let gunicorn.conf.py publish it from the master process.
+"""
+import mmap
+import os
+import signal
+import sys
+from multiprocessing import shared_memory
+from typing import Dict, Optional, Tuple
+
+from corpus import CSV_PATHS, SNAPSHOT_PATH, Corpus
+from snapshot import build_snapshot, load_snapshot_buffer, snapshot_is_fresh
+
+SHM_NAME_ENV = "POLICY_SHM_NAME"
+# published segments are named <prefix>_<publisher pid> unless a name is given
+DEFAULT_SHM_NAME = "policy_corpus"
+# where POSIX shared memory segments appear as files (Linux)
+SHM_DIR = "/dev/shm"
+
+
+def default_name() -> str:
+    return f"{DEFAULT_SHM_NAME}_{os.getpid()}"
+
+
+def unlink_stale(name: str) -> bool:
+    """Remove a segment left behind under name by a publisher that died without unlinking it."""
+    try:
+        stale = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return False
+    stale.close()
+    stale.unlink()
+    return True
+
+
+def publish(name: Optional[str] = None, snapshot_path: str = SNAPSHOT_PATH) -> shared_memory.SharedMemory:
+    """Copy the snapshot (rebuilding it first if stale) into a new shared segment.
+
+    name defaults to one unique to this process. A segment already under
+    that name can only be left over from an unclean shutdown, so it is
+    unlinked first. The caller owns the segment and must keep it
+    referenced for as long as workers use it, then close() and unlink() it.
+    """
+    name = name or default_name()
+    if not snapshot_is_fresh(snapshot_path, CSV_PATHS):
+        build_snapshot(snapshot_path, CSV_PATHS)
+    size = os.path.getsize(snapshot_path)
+    if unlink_stale(name):
+        print(f"Unlinked stale shared memory '{name}'")
+    shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+    try:
+        with open(snapshot_path, "rb") as fin:
+            fin.readinto(shm.buf[:size])
+    except BaseException:
+        shm.close()
+        shm.unlink()
+        raise
+    return shm
+
+
+def attach(name: str) -> Tuple[Corpus, Dict]:
+    """(corpus, indexes) reading straight out of the named segment."""
+    if os.name != "posix":
+        shm = shared_memory.SharedMemory(name=name)
+        corpus, indexes = load_snapshot_buffer(shm.buf)
+        corpus.backing = shm
+        return corpus, indexes
+    # Attaching through SharedMemory registers the segment with this process's
+    # resource tracker, which would unlink it (or warn about a leak) when the
+    # worker exits. 3.13 can skip the registration; before that the segment
+    # is mapped straight from /dev/shm, so the tracker never hears of it.
+    if sys.version_info >= (3, 13):
+        shm = shared_memory.SharedMemory(name=name, track=False)
+        # our own read-only view, so the SharedMemory handle can be closed now
+        # instead of complaining about exported buffers at shutdown
+        mapped = mmap.mmap(shm._fd, shm.size, access=mmap.ACCESS_READ)
+        shm.close()
+    else:
+        fd = os.open(os.path.join(SHM_DIR, name.lstrip("/")), os.O_RDONLY)
+        try:
+            mapped = mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+    corpus, indexes = load_snapshot_buffer(mapped)
+    corpus.backing = mapped
+    return corpus, indexes
+
+
+def attached_name() -> Optional[str]:
+    return os.getenv(SHM_NAME_ENV) or None
+
+
+if __name__ == "__main__":
+    shm = publish(sys.argv[1] if len(sys.argv) > 1 else None)
+    print(f"✅ Published {SNAPSHOT_PATH} as shared memory '{shm.name}' ({shm.size} bytes)")
+    print(f"   start workers with {SHM_NAME_ENV}={shm.name}; Ctrl+C to unpublish")
+    try:
+        signal.pause()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        shm.close()
+        shm.unlink()
@@ -0,0 +1,208 @@
+"""Versioned binary snapshot of the search corpus and its prebuilt indexes.
+
+Build it once after the scrapers refresh golden_dataset:
+
+    cd backend && python3 snapshot.py
+
+Layout: an 8-byte magic, a little-endian (version, header length) pair, a
+JSON header, then 8-byte aligned sections. Array sections are read back as
+memoryviews straight into a read-only mmap of the file, so loading is a
+header parse plus a few dict builds, and every worker that maps the same
+file shares its pages through the OS page cache.
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from corpus import CSV_PATHS, SNAPSHOT_PATH, Corpus, Vocab
+from search_index import InvertedIndex, SubstringIndex, build_indexes
+
+MAGIC = b"POLSNAP\0"
+# 2: date_ordinals also parse free-text news dates; 3: token substring index; 4: stored record keys;
+# 5: Hansard speech rows (csv_row_fields reads Content and puts the Speaker first in names)
+VERSION = 5
+PREAMBLE = struct.Struct("<II")
+ALIGN = 8
+
+INVERTED_INDEXES = ["content", "names", "policies"]
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _source_signatures(csv_paths: List[str]) -> Dict[str, Optional[List[int]]]:
+    signatures = {}
+    for path in csv_paths:
+        try:
+            st = os.stat(path)
+            signatures[os.path.basename(path)] = [st.st_mtime_ns, st.st_size]
+        except OSError:
+            signatures[os.path.basename(path)] = None
+    return signatures
+
+
+def _dotted_get(obj, name: str):
+    for part in name.split("."):
+        obj = getattr(obj, part)
+    return obj
+
+
+def _dotted_set(obj, name: str, value):
+    *parents, last = name.split(".")
+    for part in parents:
+        obj = getattr(obj, part)
+    setattr(obj, last, value)
+
+
+def write_snapshot(path: str, corpus: Corpus, indexes: Dict, csv_paths: List[str] = ()):
+    """Serialize corpus + indexes to path (written to a temp file, then renamed)."""
+    sections = []  # (name, typecode, payload bytes)
+
+    def add_array(name, values):
+        if isinstance(values, (bytes, bytearray)):
+            sections.append((name, "B", bytes(values)))
+        else:
+            sections.append((name, values.typecode, values.tobytes()))
+
+    def add_json(name, value):
+        sections.append((name, "json", json.dumps(value, ensure_ascii=False).encode("utf-8")))
+
+    for column in Corpus.ARRAY_COLUMNS:
+        add_array("corpus." + column, _dotted_get(corpus, column))
+    for vocab in Corpus.VOCABS:
+        add_json("corpus." + vocab, getattr(corpus, vocab).strings)
+
+    meta = {"rows": len(corpus), "total_lengths": {}}
+    for field in INVERTED_INDEXES:
+        index = indexes[field]
+        terms, arrays = index.to_flat()
+        add_json(f"index.{field}.terms", terms)
+        for key, values in arrays.items():
+            add_array(f"index.{field}.{key}", values)
+        meta["total_lengths"][field] = index.total_length
+    tokens, arrays = indexes["substring"].to_flat()
+    add_json("index.substring.tokens", tokens)
+    for key, values in arrays.items():
+        add_array(f"index.substring.{key}", values)
+
+    # offsets are relative to the first section so the header can be sized first
+    toc, cursor = {}, 0
+    for name, typecode, payload in sections:
+        toc[name] = [cursor, len(payload), typecode]
+        cursor += len(payload) + (-len(payload) % ALIGN)
+    header = json.dumps({
+        "version": VERSION,
+        "itemsizes": {code: array(code).itemsize for code in "IQi"},
+        "sources": _source_signatures(csv_paths),
+        "meta": meta,
+        "sections": toc,
+    }).encode("utf-8")
+    header += b" " * (-(len(MAGIC) + PREAMBLE.size + len(header)) % ALIGN)
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as fout:
+        fout.write(MAGIC)
+        fout.write(PREAMBLE.pack(VERSION, len(header)))
+        fout.write(header)
+        for name, typecode, payload in sections:
+            fout.write(payload)
+            fout.write(b"\0" * (-len(payload) % ALIGN))
+    os.replace(tmp_path, path)
+
+
+def read_header(buf) -> Tuple[Dict, int]:
+    """(header dict, offset of the first section) for a snapshot buffer."""
+    if len(buf) < len(MAGIC) + PREAMBLE.size or bytes(buf[:len(MAGIC)]) != MAGIC:
+        raise SnapshotError("not a policy snapshot")
+    version, header_len = PREAMBLE.unpack_from(buf, len(MAGIC))
+    if version != VERSION:
+        raise SnapshotError(f"snapshot version {version}, expected {VERSION}")
+    start = len(MAGIC) + PREAMBLE.size
+    header = json.loads(bytes(buf[start:start + header_len]))
+    for code, size in header["itemsizes"].items():
+        if array(code).itemsize != size:
+            raise SnapshotError(f"snapshot built with {code!r} itemsize {size}")
+    return header, start + header_len
+
+
+def load_snapshot_buffer(buf) -> Tuple[Corpus, Dict]:
+    """(corpus, indexes) backed by buf; arrays are views, nothing is copied."""
+    header, base = read_header(buf)
+    view = memoryview(buf)
+    toc = header["sections"]
+
+    def section(name):
+        offset, length, typecode = toc[name]
+        raw = view[base + offset:base + offset + length]
+        if typecode == "json":
+            return json.loads(bytes(raw))
+        return raw if typecode == "B" else raw.cast(typecode)
+
+    corpus = Corpus()
+    for column in Corpus.ARRAY_COLUMNS:
+        _dotted_set(corpus, column, section("corpus." + column))
+    for vocab_name in Corpus.VOCABS:
+        setattr(corpus, vocab_name, Vocab.from_strings(section("corpus." + vocab_name)))
+    corpus.names.vocab = corpus.name_vocab
+    corpus.policies.vocab = corpus.policy_vocab
+
+    meta = header["meta"]
+    indexes = {}
+    for field in INVERTED_INDEXES:
+        arrays = {
+            key: section(f"index.{field}.{key}")
+            for key in ("term_offsets", "rows", "tfs", "tokens", "token_offsets", "doc_lengths")
+        }
+        indexes[field] = InvertedIndex.from_flat(
+            section(f"index.{field}.terms"), arrays, meta["total_lengths"][field]
+        )
+    indexes["substring"] = SubstringIndex.from_flat(
+        section("index.substring.tokens"),
+        {key: section(f"index.substring.{key}") for key in ("offsets", "rows", "text_buffer", "text_offsets")},
+    )
+    return corpus, indexes
+
+
+def read_snapshot(path: str) -> Tuple[Corpus, Dict]:
+    """Map path read-only and load it. The mapping lives as long as the corpus."""
+    with open(path, "rb") as fin:
+        mapped = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+    corpus, indexes = load_snapshot_buffer(mapped)
+    corpus.backing = mapped
+    return corpus, indexes
+
+
+def snapshot_is_fresh(path: str, csv_paths: List[str]) -> bool:
+    """True if path exists and was built from the CSVs as they are on disk now."""
+    try:
+        with open(path, "rb") as fin:
+            head = fin.read(len(MAGIC) + PREAMBLE.size)
+            if len(head) < len(MAGIC) + PREAMBLE.size or head[:len(MAGIC)] != MAGIC:
+                return False
+            version, header_len = PREAMBLE.unpack_from(head, len(MAGIC))
+            if version != VERSION:
+                return False
+            header = json.loads(fin.read(header_len))
+    except (OSError, ValueError):
+        return False
+    return header.get("sources") == _source_signatures(csv_paths)
+
+
+def build_snapshot(path: str, csv_paths: List[str]) -> Corpus:
+    corpus = Corpus()
+    for csv_path in csv_paths:
+        corpus.load_csv(csv_path)
+    write_snapshot(path, corpus, build_indexes(corpus), csv_paths)
+    return corpus
+
+
+if __name__ == "__main__":
+    csv_paths = sys.argv[1:] or CSV_PATHS
+    corpus = build_snapshot(SNAPSHOT_PATH, csv_paths)
+    out = SNAPSHOT_PATH
+    print(f"✅ Wrote {len(corpus)} rows to {out} ({os.path.getsize(out)} bytes)")
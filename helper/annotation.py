@@ -0,0 +1,89 @@
+"""Batched spaCy NER stage shared by helper/extraction.py and the scrapers.
+
+Rows are streamed through nlp.pipe in batches (optionally across processes)
+with the pipeline components we never read disabled. Very long texts, such
+as full Hansard sittings, are split into chunks first so no single doc
+blows past spaCy's max_length or dominates a batch.
+"""
+import os
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+NER_MODEL = os.getenv("NER_MODEL", "en_core_web_sm")  # python -m spacy download en_core_web_sm
+# only doc.ents is used; everything else is wasted CPU
+UNUSED_COMPONENTS = ["parser", "lemmatizer", "tagger", "attribute_ruler", "senter"]
+BATCH_SIZE = 64
+CHUNK_CHARS = 50_000
+
+_nlp = None
+
+
+def load_nlp(model=NER_MODEL):
+    # imported here so a run served entirely from the annotation cache never loads spaCy
+    import spacy
+
+    nlp = spacy.load(model)
+    for name in UNUSED_COMPONENTS:
+        if name in nlp.pipe_names:
+            nlp.disable_pipe(name)
+    return nlp
+
+
+def get_nlp():
+    """Process-wide NER pipeline, loaded on first use."""
+    global _nlp
+    if _nlp is None:
+        _nlp = load_nlp()
+    return _nlp
+
+
+def chunk_text(text: str, max_chars: int = CHUNK_CHARS) -> List[str]:
+    """Split text into pieces of at most max_chars, preferring paragraph then word breaks."""
+    if len(text) <= max_chars:
+        return [text]
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + max_chars, len(text))
+        if end < len(text):
+            cut = text.rfind("\n", start, end)
+            if cut <= start:
+                cut = text.rfind(" ", start, end)
+            if cut > start:
+                end = cut + 1
+        chunks.append(text[start:end])
+        start = end
+    return chunks
+
+
+def person_names(doc) -> List[str]:
+    return [ent.text for ent in doc.ents if ent.label_ == "PERSON"]
+
+
+def annotate_rows(
+    rows: Iterable[Dict],
+    text_of: Callable[[Dict], str],
+    nlp=None,
+    batch_size: int = BATCH_SIZE,
+    n_process: int = 1,
+    max_chars: int = CHUNK_CHARS,
+) -> Iterator[Tuple[Dict, str]]:
+    """Yield (row, "Name, Name") for each row, in input order, as batches finish.
+
+    rows is consumed lazily, so the caller can write results out while the
+    rest of the input is still being read.
+    """
+    nlp = nlp or get_nlp()
+
+    def chunks():
+        for row in rows:
+            pieces = chunk_text(text_of(row) or "", max_chars)
+            for i, piece in enumerate(pieces):
+                # the row rides along with its last chunk so it can be emitted then
+                yield piece, row if i == len(pieces) - 1 else None
+
+    names = set()
+    for doc, row in nlp.pipe(chunks(), as_tuples=True, batch_size=batch_size, n_process=n_process):
+        names.update(person_names(doc))
+        if row is not None:
+            yield row, ", ".join(names)
+            names = set()
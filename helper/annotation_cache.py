@@ -0,0 +1,132 @@
+"""Persistent names/policies cache so re-annotation only touches new or changed rows.
+
+Entries are keyed by a hash of the normalized row text together with a
+version string covering the NER model and the keyword list, so upgrading
+either one invalidates old entries without having to delete the file.
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import unicodedata
+from importlib import metadata
+from itertools import chain
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from annotation import NER_MODEL, annotate_rows
+
+CACHE_PATH = os.getenv("ANNOTATION_CACHE", "annotation_cache.sqlite")
+COMMIT_EVERY = 500
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    return _WHITESPACE_RE.sub(" ", unicodedata.normalize("NFC", text or "")).strip()
+
+
+def text_key(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def model_version(model: str = NER_MODEL) -> str:
+    # read from the installed package's metadata, so checking the cache does not import spaCy
+    try:
+        return f"{model}=={metadata.version(model)}"
+    except metadata.PackageNotFoundError:
+        return model
+
+
+def cache_version(keywords: Iterable[str], model: str = NER_MODEL) -> str:
+    keyword_hash = hashlib.sha256("\n".join(keywords).encode("utf-8")).hexdigest()[:16]
+    return f"{model_version(model)}|keywords:{keyword_hash}"
+
+
+class AnnotationCache:
+    def __init__(self, path: str = CACHE_PATH, version: str = ""):
+        self.version = version
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS annotations ("
+            " text_hash TEXT NOT NULL, version TEXT NOT NULL,"
+            " names TEXT NOT NULL, policies TEXT NOT NULL,"
+            " PRIMARY KEY (text_hash, version))"
+        )
+        self._pending: List[Tuple[str, str, str, str]] = []
+
+    def get(self, key: str) -> Optional[Tuple[str, str]]:
+        row = self.conn.execute(
+            "SELECT names, policies FROM annotations WHERE text_hash = ? AND version = ?",
+            (key, self.version),
+        ).fetchone()
+        return tuple(row) if row else None
+
+    def put(self, key: str, names: str, policies: str):
+        self._pending.append((key, self.version, names, policies))
+        if len(self._pending) >= COMMIT_EVERY:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO annotations VALUES (?, ?, ?, ?)", self._pending
+                )
+            self._pending = []
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+
+def annotate_rows_cached(
+    rows: Iterable[Dict],
+    text_of: Callable[[Dict], str],
+    policies_of: Callable[[str], str],
+    cache: AnnotationCache,
+    stats: Optional[Dict[str, int]] = None,
+    **pipe_kwargs,
+) -> Iterator[Tuple[Dict, str, str]]:
+    """Yield (row, names, policies) in input order, running NLP only on cache misses.
+
+    Rows are read one at a time. Until the first miss every hit is yielded
+    as soon as it is read, and the NER model is not loaded at all. From the
+    first miss on, rows go through annotate_rows in order, hits as empty
+    text, so a hit waits for the batch it is in rather than for the next
+    miss, and no more rows are held than annotate_rows has in flight.
+    """
+    stats = stats if stats is not None else {}
+    stats.setdefault("hits", 0)
+    stats.setdefault("misses", 0)
+    rows = iter(rows)
+
+    def lookup(row):
+        key = text_key(text_of(row))
+        return row, key, cache.get(key)
+
+    def hit(item):
+        row, _, (names, policies) = item
+        stats["hits"] += 1
+        return row, names, policies
+
+    for row in rows:
+        item = lookup(row)
+        if item[2] is None:
+            break
+        yield hit(item)
+    else:
+        return
+
+    def ner_text(item):
+        return text_of(item[0]) if item[2] is None else ""
+
+    for item, names in annotate_rows(chain([item], map(lookup, rows)), ner_text, **pipe_kwargs):
+        if item[2] is not None:
+            yield hit(item)
+            continue
+        row, key, _ = item
+        policies = policies_of(text_of(row))
+        cache.put(key, names, policies)
+        stats["misses"] += 1
+        yield row, names, policies
+    cache.flush()
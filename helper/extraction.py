@@ -1,50 +1,82 @@
+import argparse
 import csv
-import spacy
-
-nlp = spacy.load("en_core_web_sm")  # Make sure you've: python -m spacy download en_core_web_sm
+from annotation import BATCH_SIZE, annotate_rows, get_nlp, person_names
+from annotation_cache import CACHE_PATH, AnnotationCache, annotate_rows_cached, cache_version
+from keywords import POLICY_KEYWORDS, matcher_from_env
 
 def extract_names(text):
-    doc = nlp(text)
-    persons = set(ent.text for ent in doc.ents if ent.label_ == "PERSON")
+    """One-off NER for a single text; use annotate_rows for whole files."""
+    persons = set(person_names(get_nlp()(text)))
     return ", ".join(persons)
 
-POLICY_KEYWORDS = [
-    "Act", "Scheme", "Policy", "COVID-19", "Grant", "Bill",
-    "Subsidy", "CPF", "HDB", "Circuit Breaker", "TraceTogether", "NDP", "Parliament",
-    "Levy", "Package", "Allowance", "Welfare", "Fund", "Support", "Programme", 
-    "Assistance", "Benefit", "Voucher", "Initiative", "Bursary", "Rebate", "Budget",
-    "Plan", "Charter", "Framework", "Mandate", "Order", "Resolution", "Pledge",
-    "Campaign", "Strategy", "Directive", "Subvention", "Provision", "Code", 
-    "Standard", "Compliance", "Agreement", "Moratorium", "Exemption", "Regulation", 
-    "Licence", "Jurisdiction", "Duty", "Tariff", "Quota", "Guideline",
-    "Sponsorship", "Petition", "Payout", "Bond", "Bonus"
-]
+policy_matcher = matcher_from_env(POLICY_KEYWORDS)
 
 def extract_policies(text):
-    policies = set()
-    for keyword in POLICY_KEYWORDS:
-        if keyword.lower() in text.lower():
-            policies.add(keyword)
-    return ", ".join(policies)
-
-# input_file = "hansard_master.csv"
-# output_file = "full_hansard_master.csv"
-# input_file = "full_cna_articles.csv"
-# output_file = "full_cna_articles_2.csv"
-input_file = "full_straits_times_articles.csv"
-output_file = "full_straits_times_articles_2.csv"
-
-with open(input_file, encoding="utf-8") as fin, open(output_file, "w", newline='', encoding="utf-8") as fout:
-    reader = csv.DictReader(fin)
-    fieldnames = reader.fieldnames + ["names", "policies"]
-    writer = csv.DictWriter(fout, fieldnames=fieldnames)
-    writer.writeheader()
-    for row in reader:
-        text = row['content'] if 'content' in row else next(
-            (row[k] for k in row if k not in ('date',)), '')
-        row['names'] = extract_names(text)
-        row['policies'] = extract_policies(text)
-        writer.writerow(row)
-
-
-print(f"Annotated CSV written to {output_file}")
\ No newline at end of file
+    return policy_matcher.extract(text)
+
+TEXT_COLUMNS = ('content', 'Content', 'raw_text')
+
+def row_text(row):
+    column = next((c for c in TEXT_COLUMNS if c in row), None)
+    if column:
+        return row[column] or ''
+    return next((row[k] for k in row if k not in ('date', 'Date')), '')
+
+def annotate_csv(input_file, output_file, batch_size=BATCH_SIZE, n_process=1, cache_path=CACHE_PATH):
+    """Stream input_file through the NER stage, writing each row as soon as it is annotated.
+
+    Rows whose text was annotated before (same model and keyword list) are
+    served from the cache at cache_path; pass cache_path=None to disable it.
+    """
+    with open(input_file, encoding="utf-8") as fin, open(output_file, "w", newline='', encoding="utf-8") as fout:
+        reader = csv.DictReader(fin)
+        fieldnames = reader.fieldnames + ["names", "policies"]
+        writer = csv.DictWriter(fout, fieldnames=fieldnames)
+        writer.writeheader()
+        stats = {}
+        if cache_path:
+            cache = AnnotationCache(cache_path, cache_version(policy_matcher.keywords))
+            annotated = annotate_rows_cached(
+                reader, row_text, extract_policies, cache, stats,
+                batch_size=batch_size, n_process=n_process,
+            )
+        else:
+            cache = None
+            annotated = (
+                (row, names, extract_policies(row_text(row)))
+                for row, names in annotate_rows(reader, row_text, batch_size=batch_size, n_process=n_process)
+            )
+        count = 0
+        try:
+            for row, names, policies in annotated:
+                row['names'] = names
+                row['policies'] = policies
+                writer.writerow(row)
+                count += 1
+                if count % 1000 == 0:
+                    fout.flush()
+                    print(f"  annotated {count} rows")
+        finally:
+            if cache:
+                cache.close()
+    if stats:
+        print(f"  cache: {stats['hits']} hits, {stats['misses']} rows sent to NER")
+    return count
+
+if __name__ == "__main__":
+    # input_file = "hansard_master.csv"
+    # output_file = "full_hansard_master.csv"
+    # input_file = "full_cna_articles.csv"
+    # output_file = "full_cna_articles_2.csv"
+    parser = argparse.ArgumentParser(description="Add names/policies columns to a scraped CSV.")
+    parser.add_argument("input_file", nargs="?", default="full_straits_times_articles.csv")
+    parser.add_argument("output_file", nargs="?", default="full_straits_times_articles_2.csv")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--n-process", type=int, default=1, help="spaCy worker processes (-1 for all cores)")
+    parser.add_argument("--cache", default=CACHE_PATH, help="annotation cache file")
+    parser.add_argument("--no-cache", action="store_true", help="re-annotate every row")
+    args = parser.parse_args()
+
+    annotate_csv(args.input_file, args.output_file, args.batch_size, args.n_process,
+                 cache_path=None if args.no_cache else args.cache)
+    print(f"Annotated CSV written to {args.output_file}")
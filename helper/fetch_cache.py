@@ -0,0 +1,160 @@
+"""Raw page store shared by the scrapers, with conditional re-fetching.
+
+Response bodies are stored gzipped under objects/, named by the sha256
+of the raw bytes, so a page that has not changed is stored once however
+often it is fetched. index.sqlite maps each URL to its current body and
+to the ETag/Last-Modified validators the server sent. A re-run sends
+those back as If-None-Match/If-Modified-Since, and a 304 is answered
+from disk without downloading the page again.
+
+FETCH_OFFLINE=1 serves every fetch from the store and never touches the
+network, so a parser change can be applied by re-running the scrapers
+against what was crawled before. A URL that was never fetched raises
+NotCached. FETCH_CACHE=0 turns the store off.
+"""
+import gzip
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterator, NamedTuple, Optional
+
+import requests
+
+FETCH_CACHE_DIR = os.getenv("FETCH_CACHE_DIR", "fetch_cache")
+ENABLED = os.getenv("FETCH_CACHE", "1") != "0"
+OFFLINE = os.getenv("FETCH_OFFLINE") == "1"
+
+
+class NotCached(requests.RequestException):
+    """An offline fetch for a URL the store has no copy of."""
+
+
+class CachedResponse(NamedTuple):
+    url: str
+    digest: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    encoding: Optional[str]
+    fetched_at: float
+
+
+class FetchCache:
+    def __init__(self, directory: str = FETCH_CACHE_DIR, offline: bool = OFFLINE):
+        self.directory = directory
+        self.offline = offline
+        self.stats: Dict[str, int] = {"fetched": 0, "not_modified": 0, "offline": 0}
+        os.makedirs(os.path.join(directory, "objects"), exist_ok=True)
+        # the scrapers fetch from worker threads; one connection, one lock
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(os.path.join(directory, "index.sqlite"), check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " url TEXT PRIMARY KEY, digest TEXT NOT NULL,"
+            " etag TEXT, last_modified TEXT, encoding TEXT,"
+            " fetched_at REAL NOT NULL, checked_at REAL NOT NULL)"
+        )
+
+    def _count(self, outcome: str):
+        with self._lock:
+            self.stats[outcome] += 1
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.directory, "objects", digest[:2], digest[2:] + ".gz")
+
+    def write_body(self, body: bytes) -> str:
+        digest = hashlib.sha256(body).hexdigest()
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with gzip.open(tmp_path, "wb") as fout:
+                fout.write(body)
+            os.replace(tmp_path, path)
+        return digest
+
+    def read_body(self, digest: str) -> bytes:
+        with gzip.open(self._object_path(digest), "rb") as fin:
+            return fin.read()
+
+    def lookup(self, url: str) -> Optional[CachedResponse]:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT url, digest, etag, last_modified, encoding, fetched_at FROM responses WHERE url = ?",
+                (url,),
+            ).fetchone()
+        return CachedResponse(*row) if row else None
+
+    def text(self, url: str) -> str:
+        """The stored body of url, decoded; NotCached if there is none."""
+        entry = self.lookup(url)
+        if entry is None:
+            raise NotCached(f"{url} is not in the fetch cache at {self.directory}")
+        return self.read_body(entry.digest).decode(entry.encoding or "utf-8", errors="replace")
+
+    def put(self, url: str, body: bytes, etag: Optional[str] = None, last_modified: Optional[str] = None,
+            encoding: Optional[str] = "utf-8"):
+        digest = self.write_body(body)
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, digest, etag, last_modified, encoding, now, now),
+            )
+
+    def put_text(self, url: str, text: str):
+        """Store a page that did not come from a plain GET (e.g. a browser's page_source)."""
+        self.put(url, text.encode("utf-8"))
+
+    def get(self, url: str, fetch: Callable[[Dict[str, str]], requests.Response]) -> str:
+        """Body of url, revalidating the stored copy.
+
+        fetch(headers) performs the GET with the extra conditional headers,
+        so each scraper keeps its own session, retries and rate limits.
+        Errors other than a 304 are raised and leave the store unchanged.
+        """
+        if self.offline:
+            self._count("offline")
+            return self.text(url)
+        entry = self.lookup(url)
+        headers = {}
+        if entry is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+        response = fetch(headers)
+        if response.status_code == 304 and entry is not None:
+            with self._lock, self.conn:
+                self.conn.execute("UPDATE responses SET checked_at = ? WHERE url = ?", (time.time(), url))
+            self._count("not_modified")
+            return self.read_body(entry.digest).decode(entry.encoding or "utf-8", errors="replace")
+        response.raise_for_status()
+        self.put(url, response.content, response.headers.get("ETag"), response.headers.get("Last-Modified"),
+                 response.encoding)
+        self._count("fetched")
+        return response.text
+
+    def urls(self, prefix: str = "") -> Iterator[str]:
+        """Stored URLs starting with prefix, for rebuilding from the store."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT url FROM responses WHERE substr(url, 1, ?) = ? ORDER BY url", (len(prefix), prefix)
+            ).fetchall()
+        return (url for (url,) in rows)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+_cache = None
+
+
+def default_cache() -> Optional[FetchCache]:
+    """Process-wide store at FETCH_CACHE_DIR, opened on first use; None when FETCH_CACHE=0."""
+    global _cache
+    if _cache is None and ENABLED:
+        _cache = FetchCache()
+    return _cache
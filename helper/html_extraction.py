@@ -0,0 +1,206 @@
+"""Selector-configured HTML extraction shared by the scrapers.
+
+Each SITES entry says which subtrees a page type needs (a SoupStrainer),
+which CSS selectors to read inside them, and which extractor turns the
+matches into records. The parser only builds the strained subtrees, so
+the scripts, navigation and ads that make up most of a news page are
+dropped while the HTML is read instead of being built into a tree and
+walked past. When a site changes its markup, the fix is an edit to its
+entry here; html_extraction_benchmark.py checks every entry against the
+saved pages in html_fixtures/.
+
+lxml is used as the parser when it is installed (pip install lxml),
+html.parser otherwise.
+"""
+import re
+from typing import Callable, Dict, List, NamedTuple, Optional, Pattern
+from urllib.parse import urljoin
+
+import soupsieve
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml  # noqa: F401
+    PARSER = "lxml"
+except ImportError:
+    PARSER = "html.parser"
+
+
+def has_class(*names: str) -> Pattern:
+    """class_ filter for a SoupStrainer: any of names among the element's classes.
+
+    The strainer sees the raw attribute ("storyline-wrapper default") while
+    the page is being read, before it is split into classes, so a plain
+    class_="storyline-wrapper" would only match elements with no other class.
+    """
+    return re.compile(r"(?:^|\s)(?:%s)(?:\s|$)" % "|".join(map(re.escape, names)))
+
+
+def text_of(tag) -> str:
+    """Tag text with runs of whitespace collapsed; inline tags join their neighbours' words as written."""
+    return " ".join(tag.get_text().split())
+
+
+class ListingItem(NamedTuple):
+    headline: str
+    url: Optional[str]
+    date: Optional[str]
+
+
+class Link(NamedTuple):
+    url: str
+    title: str
+
+
+class Article(NamedTuple):
+    headline: str
+    raw_text: str
+
+
+class Site(NamedTuple):
+    keep: SoupStrainer
+    extract: Callable[[BeautifulSoup, Dict, str], list]
+    # selectors (and the odd option) read by extract
+    selectors: Dict
+    base_url: str = ""
+
+
+def extract_listing(soup, sel, base_url) -> List[ListingItem]:
+    """One item per sel['headline'] match, with its link and date.
+
+    The link is the nearest element matching sel['link'] at or above the
+    headline. The date is the nearest sel['date'] match before the headline
+    (date_position 'before') or the first one after it and before the next
+    headline ('after'); the strained tree keeps document order, not the
+    page's nesting, so position is what ties a date to its headline.
+    """
+    items: List[ListingItem] = []
+    last_date = None
+    for el in soup.select(f"{sel['headline']}, {sel['date']}"):
+        if not soupsieve.match(sel["headline"], el):
+            text = text_of(el)
+            if sel["date_position"] == "before":
+                last_date = text
+            elif items and items[-1].date is None:
+                items[-1] = items[-1]._replace(date=text)
+            continue
+        link = soupsieve.closest(sel["link"], el)
+        href = link.get("href") if link is not None else None
+        items.append(ListingItem(
+            headline=text_of(el),
+            url=urljoin(base_url, href) if href else None,
+            date=last_date if sel["date_position"] == "before" else None,
+        ))
+    return items
+
+
+def extract_links(soup, sel, base_url) -> List[Link]:
+    """Unique links matching sel['link'], in page order.
+
+    With sel['title'], links without a matching title element are skipped
+    and the title is read from it; otherwise it is the link text, taken
+    from the first copy of a repeated link that has any. Without a base_url
+    only absolute links are kept.
+    """
+    links: List[Link] = []
+    seen: Dict[str, int] = {}
+    for a in soup.select(sel["link"]):
+        href = a.get("href")
+        if not href:
+            continue
+        if base_url:
+            href = urljoin(base_url, href)
+        elif not href.startswith("http"):
+            continue
+        if "title" in sel:
+            title_tag = a.select_one(sel["title"])
+            if title_tag is None:
+                continue
+            title = text_of(title_tag)
+        else:
+            title = text_of(a)
+        if href not in seen:
+            seen[href] = len(links)
+            links.append(Link(href, title))
+        elif title and not links[seen[href]].title:
+            links[seen[href]] = Link(href, title)
+    return links
+
+
+def extract_article(soup, sel, base_url) -> List[Article]:
+    """The page's headline (first of sel['headline'] that matches) and body text.
+
+    Always one record; body paragraphs with no text are left out.
+    """
+    headline = ""
+    for selector in sel.get("headline", ()):
+        tag = soup.select_one(selector)
+        if tag is not None:
+            headline = text_of(tag)
+            break
+    texts = (text_of(el) for el in soup.select(sel["body"]))
+    return [Article(headline, sel["join"].join(t for t in texts if t))]
+
+
+SITES: Dict[str, Site] = {
+    "cna_listing": Site(
+        keep=SoupStrainer(["a", "span"], class_=has_class("list-object__heading-link", "list-object__timestamp")),
+        extract=extract_listing,
+        selectors={
+            "headline": "a.h6__link.list-object__heading-link",
+            "link": "a",
+            "date": "span.list-object__timestamp.timestamp.timeago",
+            "date_position": "after",
+        },
+        base_url="https://www.channelnewsasia.com",
+    ),
+    "straits_times_listing": Site(
+        # the headline's <a> has no class of its own, so every link is kept
+        keep=SoupStrainer(["a", "h4", "p"]),
+        extract=extract_listing,
+        selectors={
+            "headline": "h4.font-header-sm-semibold",
+            "link": "a",
+            "date": "p.font-eyebrow-baseline-regular.text-tertiary",
+            "date_position": "before",
+        },
+        base_url="https://www.straitstimes.com",
+    ),
+    "cna_article": Site(
+        keep=SoupStrainer("div", class_=has_class("text-long")),
+        extract=extract_article,
+        selectors={"body": "div.text-long p", "join": " "},
+    ),
+    "straits_times_article": Site(
+        keep=SoupStrainer("div", class_=has_class("storyline-wrapper")),
+        extract=extract_article,
+        selectors={"body": "div.storyline-wrapper.default p", "join": " "},
+    ),
+    "lawgazette_archive": Site(
+        keep=SoupStrainer("a", class_=has_class("issue-block")),
+        extract=extract_links,
+        selectors={"link": "a.issue-block", "title": ".issue-title"},
+        base_url="https://lawgazette.com.sg",
+    ),
+    "lawgazette_issue": Site(
+        keep=SoupStrainer("div", class_=has_class("mkdf-news-item-inner")),
+        extract=extract_links,
+        selectors={"link": "div.mkdf-news-item-inner a"},
+    ),
+    "lawgazette_article": Site(
+        keep=SoupStrainer(["h1", "h2", "h3", "p"]),
+        extract=extract_article,
+        selectors={"headline": ("h2", "h1"), "body": "h2, h3, p", "join": "\n\n"},
+    ),
+}
+
+
+def parse(site: str, html: str, strain: bool = True) -> list:
+    """Records for one page of the given SITES type.
+
+    strain=False builds the whole tree first; the output is the same, it
+    is only there to measure and check the strainer against.
+    """
+    config = SITES[site]
+    soup = BeautifulSoup(html, PARSER, parse_only=config.keep if strain else None)
+    return config.extract(soup, config.selectors, config.base_url)
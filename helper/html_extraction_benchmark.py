@@ -0,0 +1,119 @@
+"""Regression check and throughput benchmark for html_extraction.
+
+Every page html_fixtures/<site>*.html is parsed as that SITES entry, once
+with the strainer and once from the full tree. Both must give the records
+saved next to the page in <page>.json. The report has pages/s and MB/s
+per site in both modes, so a selector or parser change can be checked
+and timed in one run:
+
+    cd helper && python3 html_extraction_benchmark.py --repeat 100
+
+Drop more saved pages into html_fixtures/ to widen the corpus. After a
+deliberate selector change, --record rewrites the .json files from the
+strained parse; review that diff like any other. Exits 1 on a mismatch.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from typing import Dict, List
+
+from html_extraction import PARSER, SITES, parse
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "html_fixtures")
+
+
+def fixture_pages(site: str, directory: str = FIXTURES_DIR) -> List[str]:
+    # "<site>.html" and "<site>_anything.html", but not another site sharing the prefix
+    pages = glob.glob(os.path.join(directory, f"{site}.html")) + glob.glob(os.path.join(directory, f"{site}_*.html"))
+    return sorted(p for p in pages if not any(
+        other != site and other.startswith(site) and os.path.basename(p).startswith(other) for other in SITES
+    ))
+
+
+def as_json(records: list) -> list:
+    return [record._asdict() for record in records]
+
+
+def check(site: str, path: str, html: str, record: bool) -> List[str]:
+    """Problems with one page; with record=True the expected file is rewritten instead."""
+    expected_path = os.path.splitext(path)[0] + ".json"
+    strained = as_json(parse(site, html))
+    if record:
+        with open(expected_path, "w", encoding="utf-8") as fout:
+            json.dump(strained, fout, indent=2, ensure_ascii=False)
+            fout.write("\n")
+        return []
+    problems = []
+    full = as_json(parse(site, html, strain=False))
+    if strained != full:
+        problems.append(f"{path}: strained parse differs from the full tree")
+    if not os.path.exists(expected_path):
+        problems.append(f"{path}: no {os.path.basename(expected_path)} (run with --record)")
+        return problems
+    with open(expected_path, encoding="utf-8") as fin:
+        if strained != json.load(fin):
+            problems.append(f"{path}: records differ from {os.path.basename(expected_path)}")
+    return problems
+
+
+def time_site(site: str, pages: Dict[str, str], repeat: int, strain: bool) -> Dict:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for html in pages.values():
+            parse(site, html, strain=strain)
+    elapsed = time.perf_counter() - start
+    n = repeat * len(pages)
+    size = repeat * sum(len(html.encode("utf-8")) for html in pages.values())
+    return {
+        "pages_per_s": round(n / elapsed, 1),
+        "mb_per_s": round(size / elapsed / 1e6, 2),
+        "ms_per_page": round(elapsed / n * 1000, 3),
+    }
+
+
+def run(sites: List[str], repeat: int, record: bool, directory: str = FIXTURES_DIR):
+    report = {"parser": PARSER, "repeat": repeat, "sites": {}}
+    problems = []
+    for site in sites:
+        paths = fixture_pages(site, directory)
+        if not paths:
+            problems.append(f"{site}: no fixture pages in {directory}")
+            continue
+        pages = {}
+        for path in paths:
+            with open(path, encoding="utf-8") as fin:
+                pages[path] = fin.read()
+            problems.extend(check(site, path, pages[path], record))
+        if record:
+            continue
+        strained = time_site(site, pages, repeat, strain=True)
+        full = time_site(site, pages, repeat, strain=False)
+        report["sites"][site] = {
+            "pages": len(pages),
+            "strained": strained,
+            "full_tree": full,
+            "speedup": round(full["ms_per_page"] / strained["ms_per_page"], 2),
+        }
+    report["problems"] = problems
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check and time the scrapers' HTML extraction.")
+    parser.add_argument("--sites", default=",".join(SITES), help=f"comma-separated subset of {','.join(SITES)}")
+    parser.add_argument("--repeat", type=int, default=50, help="passes over each site's pages")
+    parser.add_argument("--fixtures", default=FIXTURES_DIR, help="directory of saved pages")
+    parser.add_argument("--record", action="store_true", help="rewrite the expected .json files")
+    args = parser.parse_args()
+
+    selected = [s.strip() for s in args.sites.split(",") if s.strip()]
+    unknown = sorted(set(selected) - set(SITES))
+    if unknown:
+        parser.error(f"unknown sites: {', '.join(unknown)}")
+    report = run(selected, args.repeat, args.record, args.fixtures)
+    print(json.dumps(report, indent=2))
+    if report["problems"]:
+        sys.exit(1)
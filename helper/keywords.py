@@ -0,0 +1,70 @@
+"""Policy keyword matching shared by helper/extraction.py and the scrapers.
+
+All keywords are compiled into one case-insensitive alternation anchored on
+word boundaries, so a document is scanned once no matter how long the list
+is, and "Act" no longer matches inside "impact" or "contract".
+"""
+import json
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# newline-separated text or a JSON list; overrides the built-in lists when set
+KEYWORDS_FILE_ENV = "POLICY_KEYWORDS_FILE"
+
+POLICY_KEYWORDS = [
+    "Act", "Scheme", "Policy", "COVID-19", "Grant", "Bill",
+    "Subsidy", "CPF", "HDB", "Circuit Breaker", "TraceTogether", "NDP", "Parliament",
+    "Levy", "Package", "Allowance", "Welfare", "Fund", "Support", "Programme",
+    "Assistance", "Benefit", "Voucher", "Initiative", "Bursary", "Rebate", "Budget",
+    "Plan", "Charter", "Framework", "Mandate", "Order", "Resolution", "Pledge",
+    "Campaign", "Strategy", "Directive", "Subvention", "Provision", "Code",
+    "Standard", "Compliance", "Agreement", "Moratorium", "Exemption", "Regulation",
+    "Licence", "Jurisdiction", "Duty", "Tariff", "Quota", "Guideline",
+    "Sponsorship", "Petition", "Payout", "Bond", "Bonus"
+]
+
+
+def load_keywords(path: str) -> List[str]:
+    with open(path, encoding="utf-8") as f:
+        raw = f.read()
+    if raw.lstrip().startswith("["):
+        keywords = json.loads(raw)
+    else:
+        keywords = raw.splitlines()
+    return [k.strip() for k in keywords if k and k.strip() and not k.strip().startswith("#")]
+
+
+class KeywordMatcher:
+    """Finds whole-word, case-insensitive occurrences of a keyword list in one pass."""
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = list(dict.fromkeys(keywords))
+        self._canonical = {k.lower(): k for k in self.keywords}
+        # longest first so "Circuit Breaker" wins over a shorter overlapping keyword
+        alternation = "|".join(
+            re.escape(k) for k in sorted(self.keywords, key=len, reverse=True)
+        )
+        self._pattern = re.compile(rf"(?<!\w)(?:{alternation})(?!\w)", re.IGNORECASE) if self.keywords else None
+
+    def find(self, text: str) -> Dict[str, List[Tuple[int, int]]]:
+        """Keyword -> [(start, end), ...] for every hit, keywords in first-hit order."""
+        hits: Dict[str, List[Tuple[int, int]]] = {}
+        if not text or self._pattern is None:
+            return hits
+        for match in self._pattern.finditer(text):
+            keyword = self._canonical[match.group(0).lower()]
+            hits.setdefault(keyword, []).append(match.span())
+        return hits
+
+    def counts(self, text: str) -> Dict[str, int]:
+        return {keyword: len(spans) for keyword, spans in self.find(text).items()}
+
+    def extract(self, text: str) -> str:
+        """Comma-joined keywords present in text, as stored in the 'policies' column."""
+        return ", ".join(self.find(text))
+
+
+def matcher_from_env(default: Iterable[str] = POLICY_KEYWORDS, path: Optional[str] = None) -> KeywordMatcher:
+    path = path or os.getenv(KEYWORDS_FILE_ENV)
+    return KeywordMatcher(load_keywords(path) if path else default)
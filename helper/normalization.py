@@ -0,0 +1,88 @@
+"""Text clean-up for scraped rows, applied as they are written out.
+
+normalize_text does in one call what the scrapers' brute_clean helpers
+did over an Excel round trip. It applies NFC, repairs UTF-8 text that
+was decoded as cp1252 ("â€™" -> "’"), turns real and literal
+(backslash-r/n/t) escapes into spaces, collapses whitespace and strips.
+Every regex is compiled once, and the mojibake fixes are one
+alternation applied in a single pass. normalize_rows works on a stream
+of dict rows.
+"""
+import csv
+import os
+import re
+import unicodedata
+from typing import Dict, Iterable, Iterator, List, Optional
+
+# UTF-8 punctuation misread as cp1252
+MOJIBAKE = {
+    "â€“": "–",   # en dash
+    "â€”": "—",   # em dash
+    "â€˜": "‘",   # left single quote
+    "â€™": "’",   # right single quote
+    "â€œ": "“",   # left double quote
+    "â€\x9d": "”",  # right double quote, its last byte kept as U+009D
+    "â€": "”",    # ... or dropped, since cp1252 has no 0x9D
+    "â€¦": "…",   # ellipsis
+    "Â": "",      # stray byte in front of a non-breaking space
+}
+# longest first, so "â€™" is never taken for "â€" followed by "™"
+_MOJIBAKE_RE = re.compile("|".join(map(re.escape, sorted(MOJIBAKE, key=len, reverse=True))))
+# escapes left in the text as a backslash and r/n/t
+_ESCAPE_RE = re.compile(r"\\[rnt]")
+
+
+def _fix_mojibake(match) -> str:
+    return MOJIBAKE[match.group(0)]
+
+
+def normalize_text(value):
+    """value cleaned up if it is a string; anything else is returned as is."""
+    if not isinstance(value, str):
+        return value
+    value = unicodedata.normalize("NFC", value)
+    # the substring checks are far cheaper than a regex pass over text that needs none
+    if "â" in value or "Â" in value:
+        value = _MOJIBAKE_RE.sub(_fix_mojibake, value)
+    if "\\" in value:
+        value = _ESCAPE_RE.sub(" ", value)
+    return " ".join(value.split())
+
+
+def normalize_row(row: Dict) -> Dict:
+    return {key: normalize_text(value) for key, value in row.items()}
+
+
+def normalize_rows(rows: Iterable[Dict]) -> Iterator[Dict]:
+    for row in rows:
+        yield normalize_row(row)
+
+
+def write_csv(rows: Iterable[Dict], path: str, fieldnames: List[str], encoding: str = "utf-8",
+              normalize: bool = True) -> int:
+    """Write rows to path as they arrive (normalized unless normalize=False); returns the row count.
+
+    The file is written beside path and moved into place at the end, so a
+    failed run leaves the previous file intact.
+    """
+    tmp_path = path + ".tmp"
+    count = 0
+    with open(tmp_path, "w", newline='', encoding=encoding) as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction="ignore")
+        writer.writeheader()
+        for row in (normalize_rows(rows) if normalize else rows):
+            writer.writerow(row)
+            count += 1
+    os.replace(tmp_path, path)
+    return count
+
+
+def export_xlsx(csv_path: str, xlsx_path: Optional[str] = None, encoding: str = "utf-8") -> str:
+    """Optional Excel copy of a CSV (needs pandas and openpyxl)."""
+    import pandas as pd
+
+    xlsx_path = xlsx_path or os.path.splitext(csv_path)[0] + ".xlsx"
+    pd.read_csv(csv_path, encoding=encoding, dtype=str, keep_default_na=False).to_excel(
+        xlsx_path, index=False, engine="openpyxl"
+    )
+    return xlsx_path
@@ -1,56 +1,149 @@
 import requests
-from bs4 import BeautifulSoup
 import csv
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
 
-def extract_straits_times(url):
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "helper"))
+from fetch_cache import default_cache
+from html_extraction import parse
+
+MAX_WORKERS = 16
+PER_HOST_LIMIT = 4
+MAX_RETRIES = 3
+BACKOFF_SECONDS = 0.5
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (compatible; MinLaw2Scraper/1.0; +https://example.org)"
+}
+
+
+def make_session(pool_size=MAX_WORKERS):
+    """One keep-alive connection pool shared by every fetch worker."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(HEADERS)
+    return session
+
+
+class HostLimiter:
+    """Caps in-flight requests per host so one site never gets the whole pool."""
+
+    def __init__(self, per_host=PER_HOST_LIMIT):
+        self.per_host = per_host
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.per_host)
+            return self._semaphores[host]
+
+
+def fetch_response(url, session, limiter=None, retries=MAX_RETRIES, backoff=BACKOFF_SECONDS, timeout=10, headers=None):
+    """GET url, retrying connection errors and 429/5xx with jittered exponential backoff."""
+    for attempt in range(retries + 1):
+        try:
+            if limiter:
+                with limiter(url):
+                    resp = session.get(url, timeout=timeout, headers=headers)
+            else:
+                resp = session.get(url, timeout=timeout, headers=headers)
+            if resp.status_code not in RETRY_STATUSES or attempt == retries:
+                resp.raise_for_status()
+                return resp
+        except (requests.ConnectionError, requests.Timeout):
+            if attempt == retries:
+                raise
+        time.sleep(backoff * (2 ** attempt) * (1 + random.random()))
+
+
+def fetch(url, session, limiter=None, retries=MAX_RETRIES, backoff=BACKOFF_SECONDS, timeout=10, cache=None):
+    """Page text for url; through cache (a FetchCache) when given, so unchanged pages come back as 304s."""
+    if cache is None:
+        return fetch_response(url, session, limiter, retries, backoff, timeout).text
+    return cache.get(url, lambda headers: fetch_response(url, session, limiter, retries, backoff, timeout, headers))
+
+
+def parse_straits_times(html):
+    return parse("straits_times_article", html)[0].raw_text
+
+
+def parse_cna(html):
+    return parse("cna_article", html)[0].raw_text
+
+
+def extract_straits_times(url, session=None, limiter=None, cache=None):
     try:
-        resp = requests.get(url, timeout=10)
-        resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, "html.parser")
-        raw_text = " ".join(
-            p.get_text(strip=True)
-            for p in soup.select("div.storyline-wrapper.default p")
-        )
-        return raw_text
+        return parse_straits_times(fetch(url, session or requests, limiter, cache=cache))
     except Exception as e:
         return f"ST extraction error: {e}"
 
-def extract_cna(url):
+
+def extract_cna(url, session=None, limiter=None, cache=None):
     try:
-        resp = requests.get(url, timeout=10)
-        resp.raise_for_status()
-        soup = BeautifulSoup(resp.text, "html.parser")
-        raw_text = " ".join(
-            p.get_text(strip=True)
-            for p in soup.select("div.text-long p")
-        )
-        return raw_text
+        return parse_cna(fetch(url, session or requests, limiter, cache=cache))
     except Exception as e:
         return f"CNA extraction error: {e}"
 
-# input_csv = "cna_parliament_articles.csv"  
-# output_csv = "full_cna_articles.csv"
-input_csv = "straits_times_parliament_articles.csv"  
-output_csv = "full_straits_times_articles.csv"
-
-with open(input_csv, "r", newline='', encoding='utf-8') as f_in, \
-     open(output_csv, "w", newline='', encoding='utf-8') as f_out:
-    reader = csv.DictReader(f_in)
-    fieldnames = reader.fieldnames + ["raw_text"]
-    writer = csv.DictWriter(f_out, fieldnames=fieldnames)
-    writer.writeheader()
-
-    for row in reader:
-        url = row.get("url", "")
-        raw_text = ""
-        if "straitstimes.com" in url:
-            raw_text = extract_straits_times(url)
-        elif "channelnewsasia.com" in url:
-            raw_text = extract_cna(url)
-        else:
-            raw_text = "Domain not supported."
-        # Add column and write row
-        row["raw_text"] = raw_text
-        writer.writerow(row)
-
-print(f"Finished processing. Output written to {output_csv}")
\ No newline at end of file
+
+# domain substring -> extractor; checked in order
+EXTRACTORS = [
+    ("straitstimes.com", extract_straits_times),
+    ("channelnewsasia.com", extract_cna),
+]
+
+
+def extract_article(url, session=None, limiter=None, cache=None):
+    for domain, extractor in EXTRACTORS:
+        if domain in url:
+            return extractor(url, session, limiter, cache)
+    return "Domain not supported."
+
+
+def extract_all(urls, max_workers=MAX_WORKERS, per_host=PER_HOST_LIMIT, session=None, cache=None):
+    """Yield raw_text for each url, in input order, fetching up to max_workers at once."""
+    session = session or make_session(max_workers)
+    limiter = HostLimiter(per_host)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        # map() yields in submission order, so output rows stay aligned with input rows
+        yield from pool.map(lambda url: extract_article(url, session, limiter, cache), urls)
+
+
+def process_csv(input_csv, output_csv, max_workers=MAX_WORKERS, per_host=PER_HOST_LIMIT, cache=None):
+    cache = cache or default_cache()
+    with open(input_csv, "r", newline='', encoding='utf-8') as f_in:
+        reader = csv.DictReader(f_in)
+        fieldnames = reader.fieldnames + ["raw_text"]
+        rows = list(reader)
+
+    with open(output_csv, "w", newline='', encoding='utf-8') as f_out:
+        writer = csv.DictWriter(f_out, fieldnames=fieldnames)
+        writer.writeheader()
+        urls = [row.get("url", "") or "" for row in rows]
+        for row, raw_text in zip(rows, extract_all(urls, max_workers, per_host, cache=cache)):
+            # Add column and write row
+            row["raw_text"] = raw_text
+            writer.writerow(row)
+    return len(rows)
+
+
+if __name__ == "__main__":
+    # input_csv = "cna_parliament_articles.csv"
+    # output_csv = "full_cna_articles.csv"
+    input_csv = "straits_times_parliament_articles.csv"
+    output_csv = "full_straits_times_articles.csv"
+
+    process_csv(input_csv, output_csv)
+    print(f"Finished processing. Output written to {output_csv}")
+    if default_cache():
+        print(f"Fetch cache: {default_cache().stats}")
@@ -1,95 +1,336 @@
 import requests
-from bs4 import BeautifulSoup
-import pandas as pd
+from bs4 import BeautifulSoup, NavigableString
+from bs4.element import PreformattedString
+import csv
+import json
 import re
 import os
+import sys
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from itertools import chain
 from datetime import datetime, timedelta
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "helper"))
+from fetch_cache import default_cache
+from normalization import export_xlsx, normalize_row, normalize_text, write_csv
+
 MASTER_FILE_XLSX = "hansard_master.xlsx"
 MASTER_FILE_CSV = "/golden_dataset/full_hansard_master.csv"
+# append-only crawl output, one JSON object per sitting, compacted into the CSV at the end
+LOG_FILE = "hansard_crawl.jsonl"
+# one completed date per line (sittings and settled non-sitting days)
+CHECKPOINT_FILE = "hansard_crawl.checkpoint"
+DEFAULT_START_DATE = "22-02-2025"
+MAX_WORKERS = 8
+# a day this recent with no sitting may just not be published yet, so it is fetched again next run
+NO_SITTING_RECHECK_DAYS = 14
+SITTING_URL = "https://sprs.parl.gov.sg/search/getHansardReport/?sittingDate="
+# one master CSV row per speech; Start/End index the sitting text, which is
+# every speech's Content joined with "\n" in order
+SPEECH_FIELDS = ["Date", "Section", "Heading", "Speaker", "Start", "End", "Content"]
+# a paragraph ends at the start and end of each of these; text between them is read once, in document order
+BLOCK_TAGS = [
+    "p", "li", "h1", "h2", "h3", "h4", "h5", "h6", "td", "th", "blockquote", "pre",
+    "div", "section", "article", "ul", "ol", "table", "thead", "tbody", "tfoot", "tr",
+]
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+# a paragraph opening with one of these and a colon starts a new speaker's speech
+SPEAKER_TAGS = {"strong", "b"}
+
+
+def _clean(text):
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _node_text(node, separator=""):
+    return str(node) if isinstance(node, NavigableString) else node.get_text(separator)
+
+
+def _paragraphs(soup):
+    """[(tag name, nodes)] for each run of text and inline tags between block boundaries.
+
+    Text that sits directly in a block holding other blocks ('<li>item <p>...</p></li>',
+    a bare string in a <div>) is its own run, so nothing is dropped or read twice.
+    """
+    runs, run = [], []
+
+    def flush(owner):
+        nonlocal run
+        if run:
+            runs.append((owner.name, run))
+            run = []
+
+    def walk(element):
+        for child in element.children:
+            if isinstance(child, NavigableString):
+                # comments, doctypes and CDATA are not text, as in get_text()
+                if not isinstance(child, PreformattedString):
+                    run.append(child)
+            elif child.name in BLOCK_TAGS or child.find(BLOCK_TAGS) is not None:
+                flush(element)
+                walk(child)
+            else:
+                run.append(child)
+        flush(element)
+
+    walk(soup)
+    return runs
+
+
+def _speaker_label(nodes):
+    """(speaker, rest of the paragraph) if nodes open with a bold 'Name:' label, else (None, text).
+
+    The label may be split over several bold tags ('<b>The Minister</b> <b>for Health:</b>',
+    '<b>Mr</b><b>Speaker:</b>'); they are joined as get_text() joins them, whitespace between kept.
+    """
+    bold = []
+    for node in nodes:
+        if isinstance(node, NavigableString):
+            if node.strip():
+                break
+            bold.append(str(node))
+        elif node.name in SPEAKER_TAGS:
+            bold.append(node.get_text())
+        else:
+            break
+    text = _clean("".join(map(_node_text, nodes)))
+    label = _clean("".join(bold))
+    if not label or not text.startswith(label):
+        return None, text
+    rest = text[len(label):].lstrip()
+    if label.endswith(":"):
+        return label.rstrip(":").strip(), rest
+    if rest.startswith(":"):
+        return label, rest[1:].lstrip()
+    return None, text
+
+
+def split_speeches(html):
+    """[(heading, speaker, text)] for one section of sitting HTML, in document order.
+
+    The text is read in paragraphs that end at every block boundary (see
+    _paragraphs), so every piece of text appears exactly once. A paragraph
+    that opens with a bold 'Speaker:' label starts a new speech and the
+    paragraphs after it belong to that speech. Text before the first
+    speaker (procedural notes) has speaker None.
+    """
+    speeches = []
+    heading, speaker, paragraphs = None, None, []
 
+    def flush():
+        if paragraphs:
+            speeches.append((heading, speaker, " ".join(paragraphs)))
 
-def ensure_xlsx_from_csv():
-    """If CSV exists, convert to XLSX so we can work with it internally."""
-    if os.path.exists(MASTER_FILE_CSV):
-        print(f"📄 Found existing CSV: {MASTER_FILE_CSV}, converting to XLSX...")
-        df = pd.read_csv(MASTER_FILE_CSV)
-        df.to_excel(MASTER_FILE_XLSX, index=False)
-        print(f"✅ Converted {MASTER_FILE_CSV} to {MASTER_FILE_XLSX}")
+    for tag, nodes in _paragraphs(BeautifulSoup(html, "html.parser")):
+        if tag in HEADING_TAGS:
+            flush()
+            heading = _clean(" ".join(_node_text(node, " ") for node in nodes))
+            speaker, paragraphs = None, []
+            continue
+        label, text = _speaker_label(nodes)
+        if label:
+            flush()
+            speaker, paragraphs = label, []
+        if text:
+            paragraphs.append(text)
+    flush()
+    return speeches
+
+
+def parse_sitting(raw):
+    """Speech records for one getHansardReport response.
 
+    The API answers with JSON whose takesSectionVOList holds each section's
+    title and HTML; anything else is treated as a single HTML section.
+    Start/End are offsets into the sitting text ("\n".join of every
+    Content), which is what the old one-row-per-sitting column held, minus
+    the copies of nested text. Text is normalized here, before the offsets
+    are taken, so they index the Content that is written out.
+    """
+    try:
+        payload = json.loads(raw)
+    except ValueError:
+        payload = None
+    if isinstance(payload, dict) and isinstance(payload.get("takesSectionVOList"), list):
+        sections = [(s.get("title") or "", s.get("content") or "") for s in payload["takesSectionVOList"]]
+    else:
+        sections = [("", raw)]
 
-def save_xlsx_to_csv():
-    """Convert final XLSX back to CSV after scraping is done."""
-    if os.path.exists(MASTER_FILE_XLSX):
-        df = pd.read_excel(MASTER_FILE_XLSX)
-        df.to_csv(MASTER_FILE_CSV, index=False)
-        print(f"✅ Saved {MASTER_FILE_XLSX} back to {MASTER_FILE_CSV}")
+    records, offset = [], 0
+    for index, (title, html) in enumerate(sections):
+        for heading, speaker, text in split_speeches(html):
+            text = normalize_text(text)
+            if not text:
+                continue
+            records.append({
+                "Section": index,
+                "Heading": normalize_text(heading or _clean(BeautifulSoup(title, "html.parser").get_text(" "))),
+                "Speaker": normalize_text(speaker or ""),
+                "Start": offset,
+                "End": offset + len(text),
+                "Content": text,
+            })
+            offset += len(text) + 1
+    return records
+
+
+def fetch_sitting(sitting_date, session=requests, cache=None):
+    """Speech records of one sitting, or None when there was no sitting that day.
+
+    Raises requests exceptions on network/HTTP failure so the date is
+    retried on the next run instead of being checkpointed. With a
+    FetchCache the response is revalidated instead of downloaded again.
+    """
+    url = SITTING_URL + sitting_date
+    if cache is not None:
+        return parse_sitting(cache.get(url, lambda headers: session.get(url, headers=headers, timeout=30))) or None
+    response = session.get(url, timeout=30)
+    response.raise_for_status()
+    return parse_sitting(response.text) or None
 
 
 def scrape_hansard_api(sitting_date):
-    url = f"https://sprs.parl.gov.sg/search/getHansardReport/?sittingDate={sitting_date}"
+    """Fetch a single sitting (kept for ad-hoc use; the crawler uses fetch_sitting)."""
     try:
-        response = requests.get(url)
-        response.raise_for_status()
-    except requests.HTTPError as e:
+        speeches = fetch_sitting(sitting_date)
+    except requests.RequestException as e:
         print(f"❌ Failed to fetch data for {sitting_date}: {e}")
-        return False
+        return None
+    if speeches is None:
+        print(f"⚠️ No content found for date {sitting_date}. Skipping.")
+    return speeches
 
-    soup = BeautifulSoup(response.text, "html.parser")
 
-    all_texts = []
-    for element in soup.find_all(True, recursive=True):
-        text = element.get_text(" ", strip=True)
-        if text:
-            all_texts.append(text)
+def load_checkpoint(checkpoint_path=CHECKPOINT_FILE):
+    if not os.path.exists(checkpoint_path):
+        return set()
+    with open(checkpoint_path, encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
 
-    if not all_texts:
-        print(f"⚠️ No content found for date {sitting_date}. Skipping.")
-        return False
 
-    # Concatenate all texts into one string column "Content"
-    full_content = " ".join(all_texts)
+def crawl(dates, workers=MAX_WORKERS, log_path=LOG_FILE, checkpoint_path=CHECKPOINT_FILE, session=None, cache=None,
+          today=None):
+    """Fetch dates concurrently, appending each sitting to log_path as it completes.
 
-    data = {"Date": sitting_date, "Content": full_content}
-    new_df = pd.DataFrame([data])
+    Dates already in the checkpoint are skipped, so an interrupted backfill
+    resumes where it stopped. A date is checkpointed once its sitting is
+    logged, or once it is more than NO_SITTING_RECHECK_DAYS before today
+    with no sitting; a failed date is left for the next run. Only this
+    thread writes the log and checkpoint, and each write is flushed before
+    the date is marked done. Ctrl-C cancels the dates not yet started.
+    """
+    done = load_checkpoint(checkpoint_path)
+    todo = [d for d in dates if d not in done]
+    print(f"⏳ {len(todo)} dates to fetch ({len(done)} already done), {workers} workers")
+    session = session or requests.Session()
+    settled_before = (today or datetime.today()) - timedelta(days=NO_SITTING_RECHECK_DAYS)
+    added = 0
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        with open(log_path, "a", encoding="utf-8") as log, \
+             open(checkpoint_path, "a", encoding="utf-8") as checkpoint:
+            futures = {pool.submit(fetch_sitting, d, session, cache): d for d in todo}
+            for future in as_completed(futures):
+                sitting_date = futures[future]
+                try:
+                    speeches = future.result()
+                except requests.RequestException as e:
+                    print(f"❌ Failed to fetch data for {sitting_date}: {e}")
+                    continue
+                except Exception as e:
+                    print(f"❌ Failed to parse the sitting of {sitting_date}: {e!r}")
+                    continue
+                if speeches is not None:
+                    log.write(json.dumps({"Date": sitting_date, "Speeches": speeches}, ensure_ascii=False) + "\n")
+                    log.flush()
+                    added += 1
+                    chars = sum(len(s["Content"]) for s in speeches)
+                    print(f"✅ Fetched {sitting_date} ({len(speeches)} speeches, {chars} characters).")
+                elif datetime.strptime(sitting_date, "%d-%m-%Y") >= settled_before:
+                    continue
+                checkpoint.write(sitting_date + "\n")
+                checkpoint.flush()
+    except KeyboardInterrupt:
+        # without this, leaving the pool would wait for every queued date to be fetched
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    pool.shutdown()
+    return added
 
-    if os.path.exists(MASTER_FILE_XLSX):
-        existing_df = pd.read_excel(MASTER_FILE_XLSX)
-        # Skip if date already exists
-        if sitting_date in existing_df["Date"].astype(str).values:
-            print(f"⚠️ Date {sitting_date} already exists in master file. Skipping append.")
-            return True
-        combined_df = pd.concat([existing_df, new_df], ignore_index=True)
-    else:
-        combined_df = new_df
 
-    combined_df.to_excel(MASTER_FILE_XLSX, index=False)
-    print(f"✅ Added {sitting_date} to {MASTER_FILE_XLSX} (content length {len(full_content)} characters).")
-    return True
+def compact(log_path=LOG_FILE, csv_path=MASTER_FILE_CSV, rebuild=False):
+    """Merge the crawl log into the master CSV in one write.
 
+    Existing rows keep their order; new sittings are appended by date, one
+    row per speech, and a date that is already present is not added again.
+    A master file from before speech segmentation keeps its rows and gains
+    the speech columns. Log lines from that era ({"Date", "Content"}) still
+    become one row per sitting. rebuild=True drops the existing rows and
+    writes the log alone.
+    """
+    fieldnames, seen, counts = list(SPEECH_FIELDS), set(), {"rows": 0, "sittings": 0}
+    keep_existing = os.path.exists(csv_path) and not rebuild
+    if keep_existing:
+        with open(csv_path, encoding="utf-8") as f:
+            header = next(csv.reader(f), None)
+        if header:
+            fieldnames = header + [c for c in SPEECH_FIELDS if c not in header]
 
-def clean_master_file_bruteforce(filepath):
-    """Temp method to remove escape chars"""
-    if not os.path.exists(filepath):
-        print(f"File {filepath} does not exist. Nothing to clean.")
-        return
+    def existing_rows():
+        if keep_existing:
+            with open(csv_path, encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    seen.add(row.get("Date"))
+                    yield row
 
-    df = pd.read_excel(filepath)
+    def new_rows():
+        # runs once existing_rows is exhausted, so seen is complete
+        sittings = {}
+        if os.path.exists(log_path):
+            with open(log_path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        record = json.loads(line)
+                        if record["Date"] not in seen:
+                            sittings[record["Date"]] = record
+        counts["sittings"] = len(sittings)
+        for sitting_date in sorted(sittings, key=lambda d: datetime.strptime(d, "%d-%m-%Y")):
+            record = sittings[sitting_date]
+            speeches = record.get("Speeches")
+            if not speeches:
+                # a whole sitting from before speech segmentation, with no offsets to keep in step
+                counts["rows"] += 1
+                yield normalize_row({"Date": sitting_date, "Content": record.get("Content", "")})
+                continue
+            for speech in speeches:
+                counts["rows"] += 1
+                # parse_sitting normalized the text before taking Start/End, so it is written as is
+                yield {"Date": sitting_date, **speech}
 
-    def brute_clean(cell):
-        if isinstance(cell, str):
-            cell = cell.replace('\r', ' ').replace('\n', ' ').replace('\t', ' ')
-            cell = re.sub(r'\\[rnt]', ' ', cell)
-            cell = re.sub(r'\s+', ' ', cell)
-            return cell.strip()
-        else:
-            return cell
+    # existing rows were normalized when they were first written
+    total = write_csv(chain(existing_rows(), new_rows()), csv_path, fieldnames, normalize=False)
+    print(f"✅ Compacted {counts['sittings']} new sittings ({counts['rows']} speeches) into {csv_path} ({total} rows).")
+    return counts["sittings"]
 
-    for col in df.columns:
-        df[col] = df[col].apply(brute_clean)
 
-    df.to_excel(filepath, index=False)
-    print(f"✅ Cleaned escape characters in {filepath}.")
+def reparse_from_cache(cache, dates=None, csv_path=MASTER_FILE_CSV, workers=MAX_WORKERS):
+    """Rebuild the master CSV from stored sitting responses, without network access.
+
+    Every stored sitting (or only those in dates) is parsed again through a
+    scratch log and checkpoint, so the crawl's own files are left alone.
+    """
+    cache.offline = True
+    stored = [url[len(SITTING_URL):] for url in cache.urls(SITTING_URL)]
+    if dates is not None:
+        wanted = set(dates)
+        stored = [d for d in stored if d in wanted]
+    print(f"⏳ Re-parsing {len(stored)} stored sittings from {cache.directory}")
+    with tempfile.TemporaryDirectory() as scratch:
+        log_path = os.path.join(scratch, "crawl.jsonl")
+        crawl(stored, workers, log_path, os.path.join(scratch, "crawl.checkpoint"), cache=cache)
+        return compact(log_path, csv_path, rebuild=True)
 
 
 def daterange(start_date, end_date):
@@ -99,27 +340,37 @@ def daterange(start_date, end_date):
 
 
 if __name__ == '__main__':
-    # 1️⃣ Convert CSV to XLSX if exists
-    ensure_xlsx_from_csv()
-
-    start_date_obj = datetime.strptime("22-02-2025", "%d-%m-%Y")
-    today_obj = datetime.today()
+    parser = argparse.ArgumentParser(description="Backfill Hansard sittings into the master CSV.")
+    parser.add_argument("--start", default=DEFAULT_START_DATE, help="first date (dd-mm-YYYY)")
+    parser.add_argument("--end", default=None, help="last date (dd-mm-YYYY), default today")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    parser.add_argument("--xlsx", action="store_true", help="also export the master file as XLSX (needs pandas)")
+    parser.add_argument("--offline", action="store_true",
+                        help="rebuild the master CSV from the fetch cache instead of crawling")
+    args = parser.parse_args()
 
-    if os.path.exists(MASTER_FILE_XLSX):
-        df_existing = pd.read_excel(MASTER_FILE_XLSX)
-        if 'Date' in df_existing.columns and not df_existing.empty:
-            dates_in_file = pd.to_datetime(df_existing['Date'], dayfirst=True, errors='coerce').dropna()
-            if not dates_in_file.empty:
-                max_date = dates_in_file.max()
-                start_date_obj = max_date + timedelta(days=1)
+    start_date_obj = datetime.strptime(args.start, "%d-%m-%Y")
+    end_date_obj = datetime.strptime(args.end, "%d-%m-%Y") if args.end else datetime.today()
+    dates = [d.strftime("%d-%m-%Y") for d in daterange(start_date_obj, end_date_obj)]
+    cache = default_cache()
 
-    print(f"⏳ Starting scraping from {start_date_obj.strftime('%d-%m-%Y')} up to {today_obj.strftime('%d-%m-%Y')}")
-
-    for single_date in daterange(start_date_obj, today_obj):
-        date_str = single_date.strftime("%d-%m-%Y")
-        scrape_hansard_api(date_str)
+    if args.offline:
+        if cache is None:
+            parser.error("--offline needs the fetch cache (unset FETCH_CACHE=0)")
+        reparse_from_cache(cache, dates, workers=args.workers)
+    else:
+        print(f"⏳ Crawling from {start_date_obj.strftime('%d-%m-%Y')} up to {end_date_obj.strftime('%d-%m-%Y')}")
+        try:
+            crawl(dates, workers=args.workers, cache=cache)
+        except KeyboardInterrupt:
+            print(f"\n🛑 Crawl interrupted; sittings fetched so far are in {LOG_FILE} and are compacted next run.")
+            sys.exit(1)
 
-    clean_master_file_bruteforce(MASTER_FILE_XLSX)
+        # Compact the append-only log into the CSV once, at the end
+        compact()
+    if cache:
+        print(f"Fetch cache: {cache.stats}")
 
-    # 2️⃣ Convert XLSX back to CSV at the end
-    save_xlsx_to_csv()
+    if args.xlsx and os.path.exists(MASTER_FILE_CSV):
+        export_xlsx(MASTER_FILE_CSV, MASTER_FILE_XLSX)
+        print(f"✅ Exported {MASTER_FILE_CSV} to {MASTER_FILE_XLSX}")
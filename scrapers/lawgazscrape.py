@@ -1,37 +1,49 @@
+import argparse
+import csv
 import os
+import queue
 import re
+import sys
+import threading
 import time
-import pandas as pd
-import spacy
-from bs4 import BeautifulSoup
-import unicodedata
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "helper"))
+from fetch_cache import NotCached, default_cache
+from html_extraction import parse
+from keywords import matcher_from_env
+from normalization import export_xlsx, normalize_row, write_csv
 
 # Paths
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../../"))  # repo root
 GOLDEN_DIR = os.path.join(BASE_DIR, "golden_dataset")
 os.makedirs(GOLDEN_DIR, exist_ok=True)
-EXCEL_FILE = os.path.join(GOLDEN_DIR, "temp_lawgazette.xlsx")  # temporary
 CSV_FILE = os.path.join(GOLDEN_DIR, "lawgazette_master.csv")
-
-# NLP setup
-nlp = spacy.load("en_core_web_sm")
+XLSX_FILE = os.path.join(GOLDEN_DIR, "lawgazette_master.xlsx")  # optional export (--xlsx)
+CSV_FIELDS = ["headline", "url", "date of publish (DDMMYYYY)", "raw_text", "names", "policies"]
+# in a category page's URL, which every issue links to; such rows are told apart by issue date
+# (as corpus.record_key does)
+CATEGORY_URL_PART = "/category/"
+
+ARCHIVE_URL = "https://lawgazette.com.sg/archives/"
+WORKERS = 4
+# a page is read once the document has loaded and this matches something on it
+READY_SELECTORS = {
+    "lawgazette_archive": "a.issue-block",
+    "lawgazette_issue": "div.mkdf-news-item-inner",
+    "lawgazette_article": "h1, h2",
+}
+READY_TIMEOUT = 20
+READY_POLL = 0.1
 
 POLICY_KEYWORDS = [
     "Act", "Scheme", "Policy", "COVID-19", "Grant", "Bill",
     "Subsidy", "CPF", "HDB", "Circuit Breaker", "TraceTogether", "NDP", "Parliament"
 ]
 
-def extract_names(text):
-    doc = nlp(text)
-    persons = set(ent.text for ent in doc.ents if ent.label_ == "PERSON")
-    return ", ".join(persons)
+policy_matcher = matcher_from_env(POLICY_KEYWORDS)
 
 def extract_policies(text):
-    policies = set()
-    for keyword in POLICY_KEYWORDS:
-        if keyword.lower() in text.lower():
-            policies.add(keyword)
-    return ", ".join(policies)
+    return policy_matcher.extract(text)
 
 def extract_date_from_url(issue_url):
     """Extract month and year from issue URL as ddMMYYYY"""
@@ -41,170 +53,251 @@ def extract_date_from_url(issue_url):
         return f"dd{month}{year}"  # dd + month + year
     return ""
 
-def clean_master_file_bruteforce(filepath):
-    """Clean escape characters and fix common mis-encodings in Excel file"""
-    if not os.path.exists(filepath):
-        print(f"File {filepath} does not exist. Nothing to clean.")
-        return
-
-    df = pd.read_excel(filepath)
-
-    def brute_clean(cell):
-        if isinstance(cell, str):
-            # Remove escape characters
-            cell = cell.replace('\r', ' ').replace('\n', ' ').replace('\t', ' ')
-            cell = re.sub(r'\\[rnt]', ' ', cell)
-            cell = re.sub(r'\s+', ' ', cell)
-
-            # Normalize Unicode
-            cell = unicodedata.normalize("NFC", cell)
-
-            # Fix common mojibake (UTF-8 misread as cp1252)
-            replacements = {
-                "â€“": "–",   # en dash
-                "â€”": "—",   # em dash
-                "â€˜": "‘",   # left single quote
-                "â€™": "’",   # right single quote
-                "â€œ": "“",   # left double quote
-                "â€": "”",   # right double quote
-                "â€¦": "…",   # ellipsis
-                "Â": "",      # stray non-breaking space
-            }
-            for k, v in replacements.items():
-                cell = cell.replace(k, v)
-
-            return cell.strip()
-        else:
-            return cell
-
-    # Apply cleaning to all columns
-    for col in df.columns:
-        df[col] = df[col].apply(brute_clean)
-
-    # Save back to Excel with UTF-8 compatibility
-    df.to_excel(filepath, index=False, engine="openpyxl")
-    print(f"✅ Cleaned escape characters and fixed symbols in {filepath}.")
-
-
-def get_issue_links(driver, start_year=2025):
+def chrome_driver():
+    """Default driver_factory: one undetected Chrome per worker."""
+    import undetected_chromedriver as uc
+    return uc.Chrome()
+
+def wait_until_ready(driver, css, timeout=READY_TIMEOUT, poll=READY_POLL):
+    """Poll until the document has loaded and css matches; False if timeout passes first."""
+    deadline = time.monotonic() + timeout
+    while True:
+        if driver.execute_script("return document.readyState") == "complete" \
+                and driver.find_elements("css selector", css):
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(poll)
+
+def load_page(driver, url, site, cache=None):
+    """Rendered HTML of url once it is ready to be parsed as site, kept in the fetch cache.
+
+    With an offline cache (FETCH_OFFLINE=1) the stored copy is returned and
+    the browser is never used, so driver may be None.
+    """
+    if cache is not None and cache.offline:
+        return cache.text(url)
+    driver.get(url)
+    if not wait_until_ready(driver, READY_SELECTORS[site]):
+        print(f"⚠️ {url} not ready after {READY_TIMEOUT}s; parsing what has loaded.")
+    html = driver.page_source
+    if cache is not None:
+        cache.put_text(url, html)
+    return html
+
+def get_issue_links(driver, start_year=2025, cache=None):
     """Get all issue URLs from /archives/ starting from start_year"""
-    ARCHIVE_URL = "https://lawgazette.com.sg/archives/"
-    driver.get(ARCHIVE_URL)
-    time.sleep(2)
-    soup = BeautifulSoup(driver.page_source, "html.parser")
     issues = []
-    for a in soup.select("a.issue-block"):
-        title_tag = a.select_one(".issue-title")
-        if not title_tag:
-            continue
-        title_text = title_tag.get_text(strip=True)
-        try:
-            year = int(re.search(r"\b(\d{4})\b", title_text).group(1))
-            if year >= start_year:
-                issues.append(a.get("href"))
-        except Exception:
-            continue
+    for link in parse("lawgazette_archive", load_page(driver, ARCHIVE_URL, "lawgazette_archive", cache)):
+        year = re.search(r"\b(\d{4})\b", link.title)
+        if year and int(year.group(1)) >= start_year:
+            issues.append(link.url)
     return issues
 
-def get_article_links(driver, issue_url):
+def get_article_links(driver, issue_url, cache=None):
     """Get all article links from a single issue page"""
-    driver.get(issue_url)
-    time.sleep(1)
-    soup = BeautifulSoup(driver.page_source, "html.parser")
-    links = []
-    for a in soup.select("div.mkdf-news-item-inner a"):
-        href = a.get("href")
-        if href and href.startswith("http"):
-            links.append(href)
-    return list(set(links))  # remove duplicates
-
-def parse_article(driver, article_url, issue_url):
-    driver.get(article_url)
-    time.sleep(1)
-    soup = BeautifulSoup(driver.page_source, "html.parser")
-
-    # Headline
-    title_tag = soup.select_one("h2") or soup.select_one("h1")
-    headline = title_tag.get_text(strip=True) if title_tag else ""
-
-    # Raw text from h2, h3, p
-    body_elements = soup.find_all(["h2", "h3", "p"])
-    raw_text = "\n\n".join([el.get_text(strip=True) for el in body_elements if el.get_text(strip=True)])
+    html = load_page(driver, issue_url, "lawgazette_issue", cache)
+    return [link.url for link in parse("lawgazette_issue", html)]
+
+def parse_article(driver, article_url, issue_url, cache=None):
+    # Headline (first h2, else h1) and raw text from h2, h3, p
+    article = parse("lawgazette_article", load_page(driver, article_url, "lawgazette_article", cache))[0]
+    headline, raw_text = article.headline, article.raw_text
 
     # Date of publish from issue URL
     date_of_publish = extract_date_from_url(issue_url)
 
-    # Names & Policies
-    names = extract_names(raw_text)
-    policies = extract_policies(raw_text)
-
+    # names and policies are filled in by annotate_master, after the crawl
     return {
         "headline": headline,
         "url": article_url,
         "date of publish (DDMMYYYY)": date_of_publish,
         "raw_text": raw_text,
-        "names": names,
-        "policies": policies
+        "names": "",
+        "policies": "",
     }
 
-def save_cleaned_csv(records):
-    """Save records to Excel, clean, then convert to CSV, delete Excel"""
-    df = pd.DataFrame(records)
-    df.to_excel(EXCEL_FILE, index=False, engine="openpyxl")
-    print(f"✅ Temporary Excel saved: {EXCEL_FILE}")
-
-    # Clean escape characters
-    clean_master_file_bruteforce(EXCEL_FILE)
-
-    # Convert cleaned Excel to CSV with UTF-8
-    df_cleaned = pd.read_excel(EXCEL_FILE)
-    df_cleaned.to_csv(CSV_FILE, index=False, encoding="utf-8-sig")
-    print(f"✅ CSV saved: {CSV_FILE}")
-
-    # Delete temporary Excel
-    os.remove(EXCEL_FILE)
-    print(f"🗑 Temporary Excel deleted: {EXCEL_FILE}")
-
-def crawl_law_gazette(start_year=2025, driver=None):
-    if driver is None:
-        import undetected_chromedriver as uc
-        driver = uc.Chrome()
+def article_key(url, date_of_publish):
+    """Identity of an article: its URL, plus the issue date for a category page."""
+    return f"{url}|{date_of_publish}" if CATEGORY_URL_PART in url else url
+
+def row_key(row):
+    return article_key(row.get("url") or "", row.get("date of publish (DDMMYYYY)") or row.get("date") or "")
+
+def existing_article_keys(csv_path=None):
+    csv_path = csv_path or CSV_FILE
+    if not os.path.exists(csv_path):
+        return set()
+    with open(csv_path, newline='', encoding="utf-8-sig") as f:
+        return {row_key(row) for row in csv.DictReader(f) if row.get("url")}
+
+def annotate_master(csv_path=None, n_process=1, cache_path=None):
+    """NLP stage: fill names and policies for every row of the master CSV.
+
+    Runs after (and apart from) the crawl. Text annotated before comes
+    from the annotation cache, so after an incremental crawl only the new
+    articles go through NER.
+    """
+    from annotation_cache import CACHE_PATH, AnnotationCache, annotate_rows_cached, cache_version
+
+    csv_path = csv_path or CSV_FILE
+    if not os.path.exists(csv_path):
+        print(f"File {csv_path} does not exist. Nothing to annotate.")
+        return 0
+    with open(csv_path, newline='', encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        fieldnames = reader.fieldnames + [c for c in ("names", "policies") if c not in reader.fieldnames]
+        rows = list(reader)
+    cache = AnnotationCache(cache_path or CACHE_PATH, cache_version(policy_matcher.keywords))
+    stats = {}
+
+    def annotated():
+        for row, names, policies in annotate_rows_cached(
+            rows, lambda r: r.get("raw_text") or "", extract_policies, cache, stats, n_process=n_process,
+        ):
+            row["names"], row["policies"] = names, policies
+            yield row
 
+    try:
+        write_csv(annotated(), csv_path, fieldnames, encoding="utf-8-sig", normalize=False)
+    finally:
+        cache.close()
+    print(f"✅ Annotated {len(rows)} rows in {csv_path} ({stats['hits']} cached, {stats['misses']} sent to NER).")
+    return len(rows)
+
+def save_cleaned_csv(records, csv_path=None):
+    """Merge records into the CSV, replacing rows with the same article_key, normalizing the new ones as they are written"""
+    csv_path = csv_path or CSV_FILE
+    replaced = {row_key(record) for record in records}
+    fieldnames = list(CSV_FIELDS)
+    keep_existing = os.path.exists(csv_path)
+    if keep_existing:
+        with open(csv_path, newline='', encoding="utf-8-sig") as f:
+            header = next(csv.reader(f), None) or []
+        fieldnames = header + [c for c in CSV_FIELDS if c not in header]
+
+    def rows():
+        if keep_existing:
+            with open(csv_path, newline='', encoding="utf-8-sig") as f:
+                yield from (row for row in csv.DictReader(f) if row_key(row) not in replaced)
+        for record in records:
+            yield normalize_row(record)
+
+    total = write_csv(rows(), csv_path, fieldnames, encoding="utf-8-sig", normalize=False)
+    print(f"✅ CSV saved: {csv_path} ({len(records)} new or updated, {total} rows)")
+
+def crawl_law_gazette(start_year=2025, workers=WORKERS, driver_factory=chrome_driver, cache=None, skip_keys=None):
+    """Crawl every issue from start_year on with a pool of browser workers.
+
+    The archive, each issue and each article is one task on a shared queue;
+    issue tasks queue their articles, so all workers stay busy until the
+    last article. Articles already in CSV_FILE (or in skip_keys, when
+    given) are not fetched again, and an article linked from several
+    issues is fetched once. Articles are told apart by article_key, so a
+    category page is fetched once per issue that links to it. driver_factory() is called once per worker and
+    must return something with the WebDriver get/page_source/
+    execute_script/find_elements/quit methods. With an offline cache no
+    driver is created and the stored pages are re-parsed instead.
+
+    New records are merged into CSV_FILE without names or policies; run
+    annotate_master afterwards.
+    """
+    offline = cache is not None and cache.offline
+    skip = existing_article_keys() if skip_keys is None else set(skip_keys)
+    # created one at a time, before any work starts: parallel Chrome launches race on the patched binary
+    drivers = [None if offline else driver_factory() for _ in range(workers)]
+    tasks = queue.Queue()
+    lock = threading.Lock()
+    stopping = threading.Event()
+    results = []  # ((issue index, article index), record)
+
+    def handle(driver, kind, url, issue_url, order):
+        if kind == "archive":
+            issues = get_issue_links(driver, start_year=start_year, cache=cache)
+            print(f"Found {len(issues)} issues from {start_year} onwards.")
+            for i, issue in enumerate(issues):
+                tasks.put(("issue", issue, None, (i,)))
+        elif kind == "issue":
+            links = get_article_links(driver, url, cache)
+            date_of_publish = extract_date_from_url(url)
+            with lock:
+                new = [link for link in links if article_key(link, date_of_publish) not in skip]
+                skip.update(article_key(link, date_of_publish) for link in new)
+                print(f"Scraping issue: {url} ({len(new)} new of {len(links)} articles)")
+            for j, link in enumerate(new):
+                tasks.put(("article", link, url, order + (j,)))
+        else:
+            record = parse_article(driver, url, issue_url, cache)
+            with lock:
+                results.append((order, record))
+                print(f"    [{len(results)}] {url}")
+
+    def worker(driver):
+        while True:
+            task = tasks.get()
+            try:
+                if task is None:
+                    return
+                # once the crawl is stopping, queued tasks are let go rather than run
+                if not stopping.is_set():
+                    handle(driver, *task)
+            except NotCached as e:
+                print(f"⚠️ {e}")
+            except Exception as e:
+                print(f"❌ Failed {task[0]} {task[1]}: {e}")
+            finally:
+                tasks.task_done()
+
+    tasks.put(("archive", ARCHIVE_URL, None, ()))
+    threads = [threading.Thread(target=worker, args=(d,), daemon=True) for d in drivers]
+    for t in threads:
+        t.start()
     all_records = []
     try:
-        issues = get_issue_links(driver, start_year=start_year)
-        print(f"Found {len(issues)} issues from {start_year} onwards.")
-
-        for issue_url in issues:
-            print(f"Scraping issue: {issue_url}")
-            article_links = get_article_links(driver, issue_url)
-            print(f"  Found {len(article_links)} articles.")
-            for i, art_url in enumerate(article_links):
-                print(f"    [{i+1}/{len(article_links)}] {art_url}")
-                record = parse_article(driver, art_url, issue_url)
-                all_records.append(record)
-
+        # Queue.join() would hold off Ctrl-C until the whole crawl is done; a timed wait lets it through
+        with tasks.all_tasks_done:
+            while tasks.unfinished_tasks:
+                tasks.all_tasks_done.wait(0.5)
     finally:
+        # workers finish the page in hand and exit before their drivers are quit
+        stopping.set()
+        for _ in threads:
+            tasks.put(None)
+        for t in threads:
+            t.join()
+        for d in drivers:
+            if d is not None:
+                d.quit()
+        with lock:
+            all_records = [record for _, record in sorted(results, key=lambda r: r[0])]
         if all_records:
             save_cleaned_csv(all_records)
 
     return all_records
 
 if __name__ == "__main__":
-    driver = None
-    scraped_records = []
-    try:
-        import undetected_chromedriver as uc
-        driver = uc.Chrome()
-        scraped_records = crawl_law_gazette(start_year=2025, driver=driver)
-
-    except KeyboardInterrupt:
-        print("\n🛑 Scraper interrupted by user!")
-        if scraped_records:
-            save_cleaned_csv(scraped_records)
-
-    finally:
-        if driver:
-            driver.quit()
+    parser = argparse.ArgumentParser(description="Crawl Law Gazette issues into the master CSV, then annotate it.")
+    parser.add_argument("--start-year", type=int, default=2025)
+    parser.add_argument("--workers", type=int, default=WORKERS, help="browser instances crawling at once")
+    parser.add_argument("--stage", choices=["all", "crawl", "annotate"], default="all",
+                        help="crawl only, annotate (NER + policies) only, or both in turn")
+    parser.add_argument("--n-process", type=int, default=1, help="spaCy worker processes for annotation")
+    parser.add_argument("--xlsx", action="store_true", help=f"also export the CSV to {XLSX_FILE} (needs pandas)")
+    args = parser.parse_args()
+
+    cache = default_cache()
+    if args.stage in ("all", "crawl"):
+        try:
+            # FETCH_OFFLINE=1 rebuilds the CSV from the fetch cache without starting a browser,
+            # re-parsing every stored article rather than skipping the ones already saved
+            offline = bool(cache and cache.offline)
+            crawl_law_gazette(args.start_year, args.workers, cache=cache, skip_keys=() if offline else None)
+        except KeyboardInterrupt:
+            print("\n🛑 Scraper interrupted by user! Articles fetched so far were saved.")
+            sys.exit(1)
         print(f"💾 Scraping complete. CSV saved in {CSV_FILE}")
-
+    if args.stage in ("all", "annotate"):
+        annotate_master(n_process=args.n_process)
+    if args.xlsx and os.path.exists(CSV_FILE):
+        export_xlsx(CSV_FILE, XLSX_FILE, encoding="utf-8-sig")
+        print(f"✅ Exported {CSV_FILE} to {XLSX_FILE}")
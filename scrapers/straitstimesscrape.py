@@ -1,26 +1,24 @@
 import requests
-from bs4 import BeautifulSoup
 import csv
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "helper"))
+from fetch_cache import default_cache
+from html_extraction import parse
 
 url = "https://www.straitstimes.com/tags/singapore-parliament"
 headers = {
     "User-Agent": "Mozilla/5.0 (compatible; MinLaw2Scraper/1.0; +https://example.org)"
 }
-response = requests.get(url, headers=headers, timeout=10)
-response.raise_for_status()
-soup = BeautifulSoup(response.text, "html.parser")
-results = []
-for h4 in soup.find_all("h4", class_="font-header-sm-semibold"):
-    headline = h4.get_text(strip=True)
-    parent_a = h4.find_parent("a")
-    url = parent_a["href"] if parent_a and parent_a.has_attr("href") else None
-    date_p = h4.find_previous("p", class_="font-eyebrow-baseline-regular text-tertiary")
-    date = date_p.get_text(strip=True) if date_p else None
-    results.append({
-        "headline": headline,
-        "url": f'https://www.straitstimes.com{url}' if url else url,
-        "date": date
-    })
+cache = default_cache()
+if cache:
+    html = cache.get(url, lambda conditional: requests.get(url, headers={**headers, **conditional}, timeout=10))
+else:
+    response = requests.get(url, headers=headers, timeout=10)
+    response.raise_for_status()
+    html = response.text
+results = [item._asdict() for item in parse("straits_times_listing", html)]
 
 # Write results to a CSV file
 with open("straits_times_parliament_articles.csv", "w", newline='', encoding='utf-8') as csvfile:
@@ -0,0 +1,7 @@
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+# the backend, helpers and scrapers are run from their own directories rather than installed
+for directory in ("backend", "helper", "scrapers"):
+    sys.path.insert(0, os.path.join(ROOT, directory))
@@ -0,0 +1,15 @@
+from hansardscrape import split_speeches
+
+
+def test_text_beside_nested_blocks_is_kept():
+    html = "<div>Procedural note.<p><b>Mr A:</b> Hello.</p></div>"
+    assert split_speeches(html) == [(None, None, "Procedural note."), (None, "Mr A", "Hello.")]
+
+
+def test_list_item_text_before_its_paragraph_is_kept():
+    assert split_speeches("<ul><li>item <p>sub paragraph</p></li></ul>") == [(None, None, "item sub paragraph")]
+
+
+def test_speaker_label_split_over_adjacent_bold_tags():
+    html = "<p><b>Mr A:</b> First.</p><p><b>Mr</b><b>Speaker:</b> Order.</p>"
+    assert split_speeches(html) == [(None, "Mr A", "First."), (None, "MrSpeaker", "Order.")]
@@ -0,0 +1,40 @@
+from serialization import RowJSONCache, RowJSONLRU, dumps
+
+
+def row(row_id):
+    return {"id": f"{row_id:03d}", "content": "x" * 100}
+
+
+def test_corpus_bigger_than_the_budget_keeps_recent_rows():
+    row_size = len(dumps(row(0)))
+    lru = RowJSONLRU(max_bytes=10 * row_size)
+    cache = RowJSONCache(lru)
+    built = []
+
+    def build(row_id):
+        built.append(row_id)
+        return row(row_id)
+
+    for row_id in range(100):
+        assert cache.get(row_id, lambda: build(row_id)) == dumps(row(row_id))
+    assert lru.size <= lru.max_bytes
+    assert len(lru) == 10
+
+    built.clear()
+    # the last ten rows served are still encoded; the first ones were evicted
+    for row_id in range(90, 100):
+        cache.get(row_id, lambda: build(row_id))
+    assert built == []
+    cache.get(0, lambda: build(0))
+    assert built == [0]
+
+
+def test_segments_share_the_budget():
+    row_size = len(dumps(row(0)))
+    lru = RowJSONLRU(max_bytes=4 * row_size)
+    first, second = RowJSONCache(lru), RowJSONCache(lru)
+    for row_id in range(4):
+        first.get(row_id, lambda: row(row_id))
+        second.get(row_id, lambda: {"id": f"{row_id:03d}", "content": "y" * 100})
+    assert lru.size <= lru.max_bytes
+    assert second.get(3, lambda: None) == dumps({"id": "003", "content": "y" * 100})